@@ -4,45 +4,124 @@ Converte arquivos MIDI em WAV usando FluidSynth e SoundFonts.
 """
 
 import os
+import shutil
 import subprocess
 import logging
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+SAMPLE_RATE = 44100
+
+
+def _build_command(midi_path, output_wav_path, soundfont, cpu_cores=1, file_type="wav"):
+    # Comando para renderização offline (-F = --fast-render, sem limitar ao tempo real)
+    command = [
+        "fluidsynth",
+        "-ni",                # Sem interface gráfica
+        # Carrega só as amostras dos presets que o MIDI usa, em vez do SF2 inteiro
+        "-o", "synth.dynamic-sample-loading=1",
+        "-o", f"synth.cpu-cores={cpu_cores}",  # Vozes distribuídas entre núcleos
+        "-o", f"synth.sample-rate={SAMPLE_RATE}", # Sample rate
+        "-T", file_type,
+        "-F", output_wav_path, # Arquivo de saída
+        soundfont,
+        midi_path
+    ]
+    if output_wav_path == "-":
+        # Áudio vai para o stdout: as mensagens informativas não podem se misturar a ele
+        command.insert(1, "-q")
+    # Prioridade baixa para a interface continuar responsiva durante o lote
+    if shutil.which("nice"):
+        command = ["nice", "-n", "10"] + command
+    return command
+
+
+def _render_one(midi_path, output_wav_path, soundfont, cpu_cores=1):
+    """Renderiza um único MIDI. Fica no nível do módulo para ser despachado aos workers."""
+    logger.info(f"Renderizando {midi_path} usando SoundFont: {os.path.basename(soundfont)}...")
+    try:
+        # Descarta o stdout e guarda só o stderr (em bytes), decodificado apenas em caso de erro
+        subprocess.run(_build_command(midi_path, output_wav_path, soundfont, cpu_cores),
+                       check=True, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        logger.info(f"✓ Renderização concluída: {output_wav_path}")
+        return output_wav_path
+    except subprocess.CalledProcessError as e:
+        logger.error(f"✗ Erro na renderização do FluidSynth: {e.stderr.decode('utf-8', errors='replace')}")
+        raise e
+
 
 class AudioRenderer:
     def __init__(self, soundfont_path=None):
         # Tenta encontrar o FluidR3_GM que instalamos
         default_sf2 = "/usr/share/sounds/sf2/FluidR3_GM.sf2"
-        self.soundfont = soundfont_path if soundfont_path and os.path.exists(soundfont_path) else default_sf2
-        
-        if not os.path.exists(self.soundfont):
-            logging.warning(f"SoundFont não encontrado em {self.soundfont}. A renderização pode falhar.")
+        if soundfont_path and os.path.exists(soundfont_path):
+            self.soundfont, self._sf_ok = soundfont_path, True
+        else:
+            self.soundfont, self._sf_ok = default_sf2, os.path.exists(default_sf2)
 
-    def render(self, midi_path, output_wav_path):
+        # Verificado uma vez só: os renders do lote confiam em self._sf_ok e checam apenas os MIDIs
+        if not self._sf_ok:
+            logger.warning(f"SoundFont não encontrado em {self.soundfont}. A renderização pode falhar.")
+
+    def _check_midis(self, pairs):
+        # Valida todos os MIDIs antes de iniciar, para o lote não falhar no meio
+        for midi_path, _ in pairs:
+            if not os.path.exists(midi_path):
+                raise FileNotFoundError(f"Arquivo MIDI não encontrado: {midi_path}")
+
+    def render_batch(self, pairs):
         """
-        Renderiza um arquivo MIDI para WAV usando a CLI do FluidSynth.
+        Renderiza uma lista de pares (midi_path, output_wav_path) para WAV, em sequência.
         """
-        if not os.path.exists(midi_path):
-            raise FileNotFoundError(f"Arquivo MIDI não encontrado: {midi_path}")
-
-        print(f"Renderizando {midi_path} usando SoundFont: {os.path.basename(self.soundfont)}...")
-        
-        # Comando para renderização offline (fast-render)
-        command = [
-            "fluidsynth",
-            "-ni",                # Sem interface gráfica
-            "-F", output_wav_path, # Arquivo de saída
-            "-r", "44100",        # Sample rate
-            self.soundfont,
-            midi_path
-        ]
+        self._check_midis(pairs)
+        # Um arquivo por vez: cada render pode usar todos os núcleos
+        cpu_cores = os.cpu_count() or 1
+        return [_render_one(midi_path, output_wav_path, self.soundfont, cpu_cores)
+                for midi_path, output_wav_path in pairs]
 
+    def render_many(self, pairs, workers=None):
+        """
+        Renderiza uma lista de pares (midi_path, output_wav_path) em paralelo,
+        com um processo FluidSynth por núcleo. Retorna os WAVs na mesma ordem.
+        """
+        self._check_midis(pairs)
+        workers = min(len(pairs), workers or os.cpu_count() or 1)
+        if workers <= 1:
+            return self.render_batch(pairs)
+
+        # O trabalho pesado roda no processo do FluidSynth, fora do GIL,
+        # então threads bastam para manter todos os núcleos ocupados.
+        # Os núcleos são divididos entre os renders simultâneos.
+        cpu_cores = max(1, (os.cpu_count() or 1) // workers)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(_render_one, midi_path, output_wav_path, self.soundfont, cpu_cores)
+                       for midi_path, output_wav_path in pairs]
+            return [future.result() for future in futures]
+
+    def render_to_array(self, midi_path):
+        """
+        Renderiza o MIDI direto para a memória: o FluidSynth escreve PCM 16 bits estéreo
+        cru no stdout (-F -) e o resultado vira um array (frames, 2) int16, sem WAV em disco.
+        """
+        self._check_midis([(midi_path, None)])
+        logger.info(f"Renderizando {midi_path} usando SoundFont: {os.path.basename(self.soundfont)}...")
+        command = _build_command(midi_path, "-", self.soundfont, os.cpu_count() or 1, file_type="raw")
         try:
-            # Executa o processo e captura a saída
-            result = subprocess.run(command, check=True, capture_output=True, text=True)
-            print(f"✓ Renderização concluída: {output_wav_path}")
-            return output_wav_path
+            result = subprocess.run(command, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
         except subprocess.CalledProcessError as e:
-            print(f"✗ Erro na renderização do FluidSynth: {e.stderr}")
+            logger.error(f"✗ Erro na renderização do FluidSynth: {e.stderr.decode('utf-8', errors='replace')}")
             raise e
+        logger.info(f"✓ Renderização concluída: {midi_path} (em memória)")
+        return np.frombuffer(result.stdout, dtype=np.int16).reshape(-1, 2)
+
+    def render(self, midi_path, output_wav_path):
+        """
+        Renderiza um arquivo MIDI para WAV usando a CLI do FluidSynth.
+        """
+        return self.render_batch([(midi_path, output_wav_path)])[0]
 
 if __name__ == "__main__":
     # Teste simples
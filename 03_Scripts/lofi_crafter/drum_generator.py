@@ -3,77 +3,163 @@ Gerador de Bateria Lo-Fi - Versão Humanizada e Orgânica
 Implementa Swing, Ghost Notes e variações de Velocity para bateria acústica.
 """
 
-import random
-from mido import MidiTrack, Message
-from typing import List, Tuple
+from functools import lru_cache
+
+import numpy as np
+from mido import MidiTrack
+
+from midi_writer import encode_note_arrays, note_messages
+
+# Notas do kit General MIDI (canal 10)
+KICK = 36
+SNARE = 38
+RIMSHOT = 37
+CLOSED_HH = 42
+OPEN_HH = 46
+
+# Durações das notas em ticks
+KICK_LENGTH = 100
+SNARE_LENGTH = 120
+GHOST_LENGTH = 80
+HH_LENGTH = 80
+
+# Eventos em struct-of-arrays: tick (int32), kind (0 = note_off, 1 = note_on), note e vel (uint8).
+# No máximo 14 notas por compasso (2 kick, 2 caixa, 2 ghost, 8 hi-hat), cada uma com on e off.
+MAX_EVENTS_PER_MEASURE = 28
+
+
+def _humanize_velocity(rng, base_vel: int, variance: int, size: int) -> np.ndarray:
+    return np.clip(base_vel + rng.integers(-variance, variance + 1, size), 20, 120)
+
+
+def _humanize_time(rng, variance: int, size: int) -> np.ndarray:
+    """Micro-atrasos para o 'lazy groove'"""
+    return rng.integers(-variance, variance + 1, size)
+
+
+def _add_voice(buffers, pos, on_ticks, notes, vels, duration):
+    """Escreve os note_on/note_off de uma voz nos arrays a partir de pos; retorna a nova posição."""
+    ticks, kinds, note_arr, vel_arr = buffers
+    n = len(on_ticks)
+    ons = slice(pos, pos + n)
+    offs = slice(pos + n, pos + 2 * n)
+    ticks[ons] = np.maximum(on_ticks, 0)
+    kinds[ons] = 1
+    note_arr[ons] = notes
+    vel_arr[ons] = vels
+    ticks[offs] = on_ticks + duration
+    kinds[offs] = 0
+    note_arr[offs] = notes
+    vel_arr[offs] = 0
+    return pos + 2 * n
+
+
+@lru_cache(maxsize=64)
+def _tick_grid(measures: int, ticks_per_beat: int):
+    """
+    Grades fixas (sem humanização) de um formato (compassos, resolução): kick, caixa,
+    hi-hat e as notas da caixa. Só dependem desses dois inteiros, então são calculadas
+    uma vez e reaproveitadas (somente leitura) por todas as faixas e variações do formato.
+    """
+    half_beat = ticks_per_beat // 2
+    m_offsets = np.arange(measures) * ticks_per_beat * 4
+    kick = m_offsets[:, None] + np.array([0, 2 * ticks_per_beat + half_beat])
+    snare = (m_offsets[:, None] + np.array([1, 3]) * ticks_per_beat).ravel()
+    beats = (m_offsets[:, None] + np.arange(4) * ticks_per_beat).ravel()
+    drums = np.tile([RIMSHOT, SNARE], measures)
+    for grid in (kick, snare, beats, drums):
+        grid.flags.writeable = False
+    return kick, snare, beats, drums
+
+
+def _build_events(measures: int, ticks_per_beat: int, swing_ticks: int, rng,
+                  humanize: bool = True, ghost_notes: bool = True):
+    """
+    Gera o padrão completo de bateria já ordenado, como arrays (ticks, kinds, notes, vels).
+    Recebe apenas inteiros, flags e o gerador aleatório: não depende de mido nem da instância.
+    """
+    half_beat = ticks_per_beat // 2
+    # Sem humanização as variâncias zeram e tudo cai exatamente na grade
+    spread = (lambda variance: variance) if humanize else (lambda variance: 0)
+
+    max_events = measures * MAX_EVENTS_PER_MEASURE
+    buffers = (np.empty(max_events, np.int32), np.empty(max_events, np.uint8),
+               np.empty(max_events, np.uint8), np.empty(max_events, np.uint8))
+    pos = 0
+    kick, snare, beats, drums = _tick_grid(measures, ticks_per_beat)
+
+    # 1. Kick (Bumbo) - Mais 'solto': no 1 e sincopado no 'e' do 3
+    keep = np.ones(kick.shape, dtype=bool)
+    keep[:, 1] = rng.random(measures) >= 0.4 # Ocasionalmente pula o sincopado
+    kick = kick[keep]
+    kick = kick + _humanize_time(rng, spread(25), kick.size)
+    pos = _add_voice(buffers, pos, kick, KICK, _humanize_velocity(rng, 85, spread(10), kick.size), KICK_LENGTH)
+
+    # 2. Snare/Rimshot - 'Atrás do tempo' (laid back): Rimshot no 2, Snare no 4
+    if humanize:
+        snare = snare + rng.integers(15, 46, snare.size) # Sempre um pouco atrasado
+    pos = _add_voice(buffers, pos, snare, drums, _humanize_velocity(rng, 75, spread(15), snare.size), SNARE_LENGTH)
+
+    # Ghost notes (Notas fantasma) muito leves
+    ghost_p = 0.3 if ghost_notes else 0.0
+    ghost = snare[rng.random(snare.size) < ghost_p] + half_beat
+    pos = _add_voice(buffers, pos, ghost, SNARE, _humanize_velocity(rng, 25, spread(5), ghost.size), GHOST_LENGTH)
+
+    # 3. Hi-hat (Contratempo) - O coração do Swing
+    # Cabeça do tempo (mais forte)
+    hh_head = beats + _humanize_time(rng, spread(10), beats.size)
+    pos = _add_voice(buffers, pos, hh_head, CLOSED_HH, _humanize_velocity(rng, 65, spread(12), beats.size), HH_LENGTH)
+    # Contratempo com Swing (mais fraco)
+    hh_off = beats + swing_ticks + _humanize_time(rng, spread(10), beats.size)
+    pos = _add_voice(buffers, pos, hh_off, CLOSED_HH, _humanize_velocity(rng, 40, spread(10), beats.size), HH_LENGTH)
+
+    ticks, kinds, notes, vels = (buf[:pos] for buf in buffers)
+    # Cada voz já sai em ordem de tick (os ons e os offs são duas sequências crescentes),
+    # então a ordenação estável (timsort) só intercala essas sequências, em tempo ~linear.
+    order = np.argsort(ticks.astype(np.int64) * 2 + kinds, kind='stable')
+    return ticks[order], kinds[order], notes[order], vels[order]
+
 
 class DrumGenerator:
-    KICK = 36
-    SNARE = 38
-    RIMSHOT = 37
-    CLOSED_HH = 42
-    OPEN_HH = 46
+    KICK = KICK
+    SNARE = SNARE
+    RIMSHOT = RIMSHOT
+    CLOSED_HH = CLOSED_HH
+    OPEN_HH = OPEN_HH
 
-    def __init__(self, style, bpm):
+    def __init__(self, style, bpm, seed=None, humanize: bool = True, ghost_notes: bool = True):
+        """
+        humanize=False gera a bateria 'sincronizada' (tudo na grade, velocities fixas);
+        ghost_notes=False remove as notas fantasma da caixa.
+        """
         self.style = style
         self.bpm = bpm
+        self.humanize = humanize
+        self.ghost_notes = ghost_notes
+        # Gerador próprio: sem o lock do módulo random e reprodutível quando há seed
+        self._rng = np.random.default_rng(seed)
         # Swing agressivo de tercina (58-62% é o 'sweet spot' do Lo-Fi)
-        self.swing = random.uniform(0.58, 0.62)
+        self.swing = self._rng.uniform(0.58, 0.62)
 
-    def _humanize_velocity(self, base_vel: int, variance: int = 20) -> int:
-        return max(20, min(120, base_vel + random.randint(-variance, variance)))
+    def _events(self, ticks_per_beat: int, measures: int):
+        # O swing vira um deslocamento inteiro em ticks uma única vez, fora do padrão
+        swing_ticks = int(ticks_per_beat * self.swing)
+        return _build_events(measures, ticks_per_beat, swing_ticks, self._rng,
+                             self.humanize, self.ghost_notes)
 
-    def _humanize_time(self, variance: int = 15) -> int:
-        """Micro-atrasos para o 'lazy groove'"""
-        return random.randint(-variance, variance)
+    def encode_drum_track(self, ticks_per_beat: int, measures: int = 16) -> bytes:
+        """
+        Mesma bateria do generate_drum_track, mas já codificada como corpo de MTrk
+        (para o midi_writer.fast_save), direto dos arrays e sem objetos Message.
+        """
+        ticks, kinds, notes, vels = self._events(ticks_per_beat, measures)
+        status = np.where(kinds == 1, 0x99, 0x89)  # note_on / note_off no canal 10
+        return encode_note_arrays(np.diff(ticks, prepend=0), status, notes, vels)
 
     def generate_drum_track(self, mid, measures: int = 16) -> MidiTrack:
         track = MidiTrack()
-        ticks_per_beat = mid.ticks_per_beat
-        ticks_per_measure = ticks_per_beat * 4
-        
-        events = []
-        for m in range(measures):
-            m_offset = m * ticks_per_measure
-            
-            # 1. Kick (Bumbo) - Mais 'solto'
-            for b in [0, 2.5]: # Kick no 1 e sincopado no 'e' do 3
-                if b == 2.5 and random.random() < 0.4: continue # Ocasionalmente pula o sincopado
-                t = int(m_offset + b * ticks_per_beat) + self._humanize_time(25)
-                events.append((max(0, t), 'on', self.KICK, self._humanize_velocity(85, 10)))
-                events.append((t + 100, 'off', self.KICK, 0))
-            
-            # 2. Snare/Rimshot - 'Atrás do tempo' (laid back)
-            for b in [1, 3]:
-                # Rimshot no 2, Snare no 4 (ou vice-versa)
-                drum = self.RIMSHOT if b == 1 else self.SNARE
-                t = int(m_offset + b * ticks_per_beat) + random.randint(15, 45) # Sempre um pouco atrasado
-                events.append((t, 'on', drum, self._humanize_velocity(75, 15)))
-                events.append((t + 120, 'off', drum, 0))
-                
-                # Ghost notes (Notas fantasma) muito leves
-                if random.random() < 0.3:
-                    ghost_t = t + int(ticks_per_beat * 0.5)
-                    events.append((ghost_t, 'on', self.SNARE, self._humanize_velocity(25, 5)))
-                    events.append((ghost_t + 80, 'off', self.SNARE, 0))
-            
-            # 3. Hi-hat (Contratempo) - O coração do Swing
-            for b in range(4):
-                # Cabeça do tempo (mais forte)
-                t1 = m_offset + b * ticks_per_beat + self._humanize_time(10)
-                events.append((max(0, t1), 'on', self.CLOSED_HH, self._humanize_velocity(65, 12)))
-                events.append((t1 + 80, 'off', self.CLOSED_HH, 0))
-                
-                # Contratempo com Swing (mais fraco)
-                t2 = m_offset + b * ticks_per_beat + int(ticks_per_beat * self.swing) + self._humanize_time(10)
-                events.append((t2, 'on', self.CLOSED_HH, self._humanize_velocity(40, 10)))
-                events.append((t2 + 80, 'off', self.CLOSED_HH, 0))
-
-        events.sort()
-        last_tick = 0
-        for tick, type, note, vel in events:
-            delta = tick - last_tick
-            track.append(Message('note_on' if type == 'on' else 'note_off', 
-                                 note=note, velocity=vel, time=delta, channel=9))
-            last_tick = tick
+        ticks, kinds, notes, vels = self._events(mid.ticks_per_beat, measures)
+
+        # Deltas calculados de uma vez e mensagens montadas pelo mesmo helper das outras tracks
+        track.extend(note_messages(np.diff(ticks, prepend=0), kinds, notes, vels, channel=9))
         return track
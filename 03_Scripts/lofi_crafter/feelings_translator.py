@@ -1,66 +1,132 @@
+import gc
+import os
+import numpy as np
 import scipy.io.wavfile
+import torch
+from packaging.version import Version
 from transformers import AutoProcessor, MusicgenForConditionalGeneration
 import sys
 from pathlib import Path
 import tkinter as tk
 from tkinter import messagebox
 import threading
+import queue
 import datetime
 import time
 
+# O MusicGen (~1 GB de pesos) fica residente entre os lotes
+_MODELO = None
+_PROCESSADOR = None
+_TRAVA_MODELO = threading.Lock()
+
+# Usa a GPU quando existir; em CUDA os pesos vão em FP16 (metade da memória e da banda)
+_DISPOSITIVO = "cuda" if torch.cuda.is_available() else "cpu"
+_DTYPE = torch.float16 if _DISPOSITIVO == "cuda" else torch.float32
+
+# Pasta de saída dos áudios, resolvida uma única vez na importação
+_PASTA_ATUAL = Path(__file__).parent.resolve()
+
+# Quantas faixas são geradas por chamada do generate (limita a memória em lotes grandes)
+FAIXAS_POR_GERACAO = 8
+
+def _carregar_modelo():
+    """Carrega o processador e o modelo na primeira chamada e reaproveita nas seguintes."""
+    global _MODELO, _PROCESSADOR
+    with _TRAVA_MODELO:
+        if _MODELO is None:
+            _PROCESSADOR = AutoProcessor.from_pretrained("facebook/musicgen-small")
+            _MODELO = MusicgenForConditionalGeneration.from_pretrained(
+                "facebook/musicgen-small", torch_dtype=_DTYPE
+            ).to(_DISPOSITIVO)
+            _MODELO.eval()
+            if _DISPOSITIVO == "cuda" and Version(torch.__version__).release >= (2, 1):
+                # Compila o forward (chamado uma vez por token) em kernels fundidos. Sem
+                # aquecimento: tamanho do lote e do prompt variam entre chamadas, então a
+                # compilação acontece no primeiro generate real de cada formato
+                _MODELO.forward = torch.compile(_MODELO.forward, mode="reduce-overhead", fullgraph=False)
+        return _PROCESSADOR, _MODELO
+
+def _na_interface(funcao, *args, **kwargs):
+    """O Tkinter não é thread-safe: agenda a chamada no loop principal da janela."""
+    janela.after(0, lambda: funcao(*args, **kwargs))
+
 def compor_musica(sentimento, duracao_segundos, quantidade, label_status, botao_gerar):
     try:
-        label_status.config(text="Status: A carregar a IA na memória...", fg="orange")
-        botao_gerar.config(state="disabled")
+        _na_interface(label_status.config, text="Status: A carregar a IA na memória...", fg="orange")
+        _na_interface(botao_gerar.config, state="disabled")
         
-        # Carrega o modelo pesado apenas UMA VEZ antes do loop começar
-        processor = AutoProcessor.from_pretrained("facebook/musicgen-small")
-        model = MusicgenForConditionalGeneration.from_pretrained("facebook/musicgen-small")
-        
-        pasta_atual = Path(__file__).parent.resolve()
+        # Carrega o modelo pesado apenas UMA VEZ (os lotes seguintes reutilizam o mesmo)
+        processor, model = _carregar_modelo()
         
         # Marca o tempo de início de todo o lote
         inicio_lote = time.time()
         
-        # Inicia a produção em batelada
-        for i in range(quantidade):
-            label_status.config(text=f"Status: A renderizar áudio {i+1} de {quantidade}...", fg="blue")
-            
-            inputs = processor(
-                text=[sentimento],
-                padding=True,
-                return_tensors="pt",
-            )
+        # Carimbo único do lote: os arquivos são diferenciados pelo índice, sem risco de
+        # dois áudios gravados no mesmo segundo receberem o mesmo nome
+        carimbo_lote = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        
+        # O prompt é o mesmo em todo o lote: tokeniza uma única vez, já no tamanho do maior
+        # bloco (o último bloco, se menor, usa só as primeiras linhas)
+        inputs = processor(
+            text=[sentimento] * min(FAIXAS_POR_GERACAO, quantidade),
+            padding=True,
+            return_tensors="pt",
+        ).to(_DISPOSITIVO)
+        
+        tokens = int((duracao_segundos / 5) * 256)
+        
+        # Inicia a produção em batelada: cada chamada do generate produz várias faixas
+        # (o mesmo prompt repetido, com amostragem diferente em cada linha do lote)
+        for inicio in range(0, quantidade, FAIXAS_POR_GERACAO):
+            n_faixas = min(FAIXAS_POR_GERACAO, quantidade - inicio)
+            _na_interface(label_status.config, text=f"Status: A renderizar áudios {inicio+1} a {inicio+n_faixas} de {quantidade}...", fg="blue")
             
-            tokens = int((duracao_segundos / 5) * 256)
+            entradas_bloco = {nome: tensor[:n_faixas] for nome, tensor in inputs.items()}
             
-            # --- INÍCIO DO CRONÔMETRO DA FAIXA ---
-            inicio_faixa = time.time()
+            # --- INÍCIO DO CRONÔMETRO DO BLOCO ---
+            inicio_bloco = time.time()
             
             # do_sample=True é o segredo para a IA não gerar a mesma música repetida
             # guidance_scale=4.5 mantém a IA focada no seu prompt
-            audio_values = model.generate(**inputs, max_new_tokens=tokens, do_sample=True, guidance_scale=4.5, temperature=0.7)
+            with torch.inference_mode():
+                audio_values = model.generate(**entradas_bloco, max_new_tokens=tokens, do_sample=True, guidance_scale=4.5, temperature=0.7)
             
-            # --- FIM DO CRONÔMETRO DA FAIXA ---
-            fim_faixa = time.time()
-            tempo_faixa = fim_faixa - inicio_faixa
+            # --- FIM DO CRONÔMETRO DO BLOCO ---
+            fim_bloco = time.time()
+            tempo_bloco = fim_bloco - inicio_bloco
             
-            # Formata o tempo da faixa para ficar bonitinho no terminal (ex: 1m 15s ou 45.5s)
-            minutos_faixa = int(tempo_faixa // 60)
-            segundos_faixa = int(tempo_faixa % 60)
-            tempo_formatado = f"{minutos_faixa}m {segundos_faixa}s" if minutos_faixa > 0 else f"{tempo_faixa:.1f}s"
+            # Formata o tempo do bloco para ficar bonitinho no terminal (ex: 1m 15s ou 45.5s)
+            minutos_bloco = int(tempo_bloco // 60)
+            segundos_bloco = int(tempo_bloco % 60)
+            tempo_formatado = f"{minutos_bloco}m {segundos_bloco}s" if minutos_bloco > 0 else f"{tempo_bloco:.1f}s"
             
             taxa_amostragem = model.config.audio_encoder.sampling_rate
-            dados_audio = audio_values[0, 0].numpy()
             
-            # Cria um nome único com timestamp para não sobrescrever os arquivos
-            timestamp = datetime.datetime.now().strftime("%H%M%S")
-            caminho_saida = pasta_atual / f"trilha_lofi_vibe_{i+1}_{timestamp}.wav"
+            # audio_values tem formato (n_faixas, 1, amostras): converte o bloco inteiro para
+            # PCM 16 bits ainda no dispositivo e copia para a CPU uma vez só (uma faixa por linha).
+            # PCM 16 bits tem metade do tamanho do float32 e é o formato padrão de distribuição.
+            pcm_bloco = np.ascontiguousarray(
+                (audio_values[:, 0].float().clamp(-1.0, 1.0) * 32767.0).to(torch.int16).cpu().numpy()
+            )
             
-            scipy.io.wavfile.write(str(caminho_saida), rate=taxa_amostragem, data=dados_audio)
+            for j in range(n_faixas):
+                i = inicio + j
+                _na_interface(label_status.config, text=f"Status: A guardar áudio {i+1} de {quantidade}...", fg="blue")
+                
+                # Cria um nome único (carimbo do lote + índice) para não sobrescrever os arquivos
+                caminho_saida = _PASTA_ATUAL / f"trilha_lofi_vibe_{carimbo_lote}_{i+1:03d}.wav"
+                
+                # Cada linha do array contíguo já é uma view contígua: gravada sem cópia extra
+                scipy.io.wavfile.write(os.fspath(caminho_saida), rate=taxa_amostragem, data=pcm_bloco[j])
+                
+                # Agora o terminal mostra o tempo exato que levou para gerar!
+                print(f"Áudio {i+1} guardado! (Tempo de geração do bloco: {tempo_formatado}) -> {caminho_saida}")
             
-            # Agora o terminal mostra o tempo exato que levou para gerar!
-            print(f"Áudio {i+1} guardado! (Tempo de geração: {tempo_formatado}) -> {caminho_saida}")
+            # Libera os tensores do bloco antes do próximo generate para não acumular memória
+            del audio_values, entradas_bloco, pcm_bloco
+            gc.collect()
+            if _DISPOSITIVO == "cuda":
+                torch.cuda.empty_cache()
             
         # Calcula o tempo total que o lote inteiro demorou
         fim_lote = time.time()
@@ -68,7 +134,7 @@ def compor_musica(sentimento, duracao_segundos, quantidade, label_status, botao_
         minutos_totais = int(tempo_total_lote // 60)
         segundos_totais = int(tempo_total_lote % 60)
             
-        label_status.config(text=f"Status: Sucesso! {quantidade} áudios gerados.", fg="green")
+        _na_interface(label_status.config, text=f"Status: Sucesso! {quantidade} áudios gerados.", fg="green")
         
         # Mostra o tempo total na caixinha final
         mensagem_final = (
@@ -76,13 +142,13 @@ def compor_musica(sentimento, duracao_segundos, quantidade, label_status, botao_
             f"Foram guardadas {quantidade} músicas na sua pasta.\n\n"
             f"⏱️ Tempo total de processamento: {minutos_totais}m e {segundos_totais}s"
         )
-        messagebox.showinfo("Lote Finalizado", mensagem_final)
+        _na_interface(messagebox.showinfo, "Lote Finalizado", mensagem_final)
         
     except Exception as e:
-        label_status.config(text="Status: Erro na geração.", fg="red")
-        messagebox.showerror("Erro", f"Ocorreu um erro:\n{str(e)}")
+        _na_interface(label_status.config, text="Status: Erro na geração.", fg="red")
+        _na_interface(messagebox.showerror, "Erro", f"Ocorreu um erro:\n{str(e)}")
     finally:
-        botao_gerar.config(state="normal")
+        _na_interface(botao_gerar.config, state="normal")
 
 def iniciar_geracao():
     sentimento = entrada_sentimento.get()
@@ -97,10 +163,21 @@ def iniciar_geracao():
         messagebox.showwarning("Aviso", "Por favor, descreva o sentimento ou estilo da música.")
         return
 
-    # Inicia o processamento em background
-    thread = threading.Thread(target=compor_musica, args=(sentimento, duracao, quantidade, label_status, botao_gerar))
-    thread.daemon = True
-    thread.start()
+    # Envia o pedido para a thread de fundo (cliques repetidos entram na fila em vez de competir)
+    botao_gerar.config(state="disabled")
+    _PEDIDOS.put((sentimento, duracao, quantidade, label_status, botao_gerar))
+
+def _processar_pedidos():
+    """Thread de fundo única e permanente que executa os lotes na ordem em que foram pedidos."""
+    while True:
+        pedido = _PEDIDOS.get()
+        try:
+            compor_musica(*pedido)
+        finally:
+            _PEDIDOS.task_done()
+
+_PEDIDOS = queue.Queue()
+threading.Thread(target=_processar_pedidos, daemon=True).start()
 
 # ==========================================
 # INTERFACE GRÁFICA DA MÁQUINA DE LOTE
@@ -4,16 +4,151 @@ Sistema consolidado: MIDI -> Renderização SF2 -> Pós-Produção (Filtros + Ca
 """
 
 import os
-import random
 import argparse
+import logging
+import multiprocessing
+import queue
+import threading
+from pathlib import Path
+from logging.handlers import MemoryHandler, QueueHandler, QueueListener
+from types import MappingProxyType
+from functools import lru_cache, partial
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from typing import Optional, Dict, List
-from mido import MidiFile, MidiTrack, MetaMessage, Message
+import numpy as np
+from mido import MidiFile, MidiTrack, MetaMessage
 import mido
 
 from midi_generator import LofiMidiGenerator, LofiStyle
 from drum_generator import DrumGenerator
-from audio_renderer import AudioRenderer
+from audio_renderer import AudioRenderer, SAMPLE_RATE
 from post_processor import PostProcessor
+from midi_writer import fast_save
+
+logger = logging.getLogger(__name__)
+
+
+_TIME_SIGNATURE = MetaMessage('time_signature', numerator=4, denominator=4, clocks_per_click=24, notated_32nd_notes_per_beat=8, time=0)
+
+
+@lru_cache(maxsize=64)
+def _tempo_meta(bpm: int) -> MetaMessage:
+    return MetaMessage('set_tempo', tempo=mido.bpm2tempo(bpm), time=0)
+
+
+@lru_cache(maxsize=32)
+def _get_generator(key: str, mode: str) -> LofiMidiGenerator:
+    """
+    Gerador reaproveitado entre faixas e estilos com o mesmo (tom, modo), só pela escala e
+    pela tabela de notas. Nunca é alterado depois de criado: cada track recebe o próprio
+    gerador aleatório via rng=, então threads e faixas simultâneas não dividem estado.
+    """
+    return LofiMidiGenerator(key=key, mode=mode)
+
+
+def _build_scaffold(bpm: int) -> MidiTrack:
+    """
+    Track de tempo (set_tempo + compasso 4/4) de um BPM. As mensagens nunca são alteradas
+    depois de criadas, então ficam em cache e são compartilhadas entre as faixas, sem cópia.
+    """
+    return MidiTrack([_tempo_meta(bpm), _TIME_SIGNATURE])
+
+
+# Tonalidade -> (tônica, modo) para as 17 grafias de nota, maiores e menores ('Am')
+_KEY_MODE_TABLE = {k: (k, 'major') for k in ('C', 'C#', 'Db', 'D', 'D#', 'Eb', 'E', 'F', 'F#',
+                                             'Gb', 'G', 'G#', 'Ab', 'A', 'A#', 'Bb', 'B')}
+_KEY_MODE_TABLE.update({k + 'm': (k, 'minor') for k in list(_KEY_MODE_TABLE)})
+
+# Presets no nível do módulo: construídos uma vez na importação e compartilhados, somente
+# leitura, por todas as instâncias (o LofiEngine só guarda uma referência)
+_PRESETS = {
+    LofiStyle.CHILLHOP: {
+        'name': 'Chillhop',
+        'description': 'Piano de feltro, baixos marcados e beats consistentes',
+        'bpm_range': (75, 90),
+        'key_preferences': ['C', 'F', 'G', 'D'],
+        'mode': 'minor',
+        'measures': 16,
+        'has_drums': True,
+    },
+    LofiStyle.JAZZHOP: {
+        'name': 'Jazzhop',
+        'description': 'Progressões jazzísticas complexas com swing acentuado',
+        'bpm_range': (80, 95),
+        'key_preferences': ['Eb', 'Bb', 'F', 'Ab'],
+        'mode': 'dorian',
+        'measures': 16,
+        'has_drums': True,
+    },
+    LofiStyle.SLEEP: {
+        'name': 'Sleep/Ambient Lo-Fi',
+        'description': 'Andamento lento, bateria sutil, acordes sustentados',
+        'bpm_range': (60, 70),
+        'key_preferences': ['A', 'E', 'D', 'G'],
+        'mode': 'minor',
+        'measures': 24,
+        'has_drums': False,
+    },
+    LofiStyle.AMBIENT: {
+        'name': 'Ambient Lo-Fi',
+        'description': 'Atmosférico, foco em texturas e pads',
+        'bpm_range': (60, 70),
+        'key_preferences': ['A', 'E', 'D'],
+        'mode': 'minor',
+        'measures': 24,
+        'has_drums': False,
+    },
+    LofiStyle.SAD: {
+        'name': 'Sad Lo-Fi',
+        'description': 'Progressões em tons menores, melodias melancólicas',
+        'bpm_range': (70, 80),
+        'key_preferences': ['Am', 'Dm', 'Em', 'Bm'],
+        'mode': 'minor',
+        'measures': 16,
+        'has_drums': True,
+        'instruments': ['piano', 'bass', 'pad', 'strings', 'melody']
+    },
+    LofiStyle.NOSTALGIC: {
+        'name': 'Nostalgic Lo-Fi',
+        'description': 'Melodias espaçadas e emotivas, progressões nostálgicas',
+        'bpm_range': (70, 80),
+        'key_preferences': ['C', 'G', 'D', 'A'],
+        'mode': 'minor',
+        'measures': 16,
+        'has_drums': True,
+        'instruments': ['piano', 'bass', 'guitar', 'flute']
+    },
+    LofiStyle.ORIENTAL: {
+        'name': 'Oriental Lo-Fi',
+        'description': 'Escalas pentatônicas com Koto e Shakuhachi',
+        'bpm_range': (65, 75),
+        'key_preferences': ['Am', 'Dm', 'Em'],
+        'mode': 'pentatonic_minor',
+        'measures': 16,
+        'has_drums': True,
+        'instruments': ['piano', 'bass', 'koto', 'shakuhachi']
+    },
+    LofiStyle.NORDESTE: {
+        'name': 'Nordeste Lo-Fi (Baiao-Hop)',
+        'description': 'Ritmos nordestinos com Sanfona e escala Lídio b7',
+        'bpm_range': (80, 95),
+        'key_preferences': ['G', 'D', 'A'],
+        'mode': 'lydian_b7',
+        'measures': 16,
+        'has_drums': True,
+        'instruments': ['piano', 'bass', 'accordion']
+    },
+}
+
+def _slugify(name: str) -> str:
+    return name.lower().replace('/', '_').replace(' ', '_')
+
+
+# O slug do nome entra no nome dos arquivos: calculado uma vez aqui, não a cada faixa
+STYLE_PRESETS = MappingProxyType({
+    style: MappingProxyType({**preset, 'slug': _slugify(preset['name'])})
+    for style, preset in _PRESETS.items()
+})
 
 
 class LofiEngine:
@@ -22,96 +157,50 @@ class LofiEngine:
     Consolida harmonia, melodia, bateria e masterização em um único fluxo.
     """
     
-    STYLE_PRESETS = {
-        LofiStyle.CHILLHOP: {
-            'name': 'Chillhop',
-            'description': 'Piano de feltro, baixos marcados e beats consistentes',
-            'bpm_range': (75, 90),
-            'key_preferences': ['C', 'F', 'G', 'D'],
-            'mode': 'minor',
-            'measures': 16,
-            'has_drums': True,
-        },
-        LofiStyle.JAZZHOP: {
-            'name': 'Jazzhop',
-            'description': 'Progressões jazzísticas complexas com swing acentuado',
-            'bpm_range': (80, 95),
-            'key_preferences': ['Eb', 'Bb', 'F', 'Ab'],
-            'mode': 'dorian',
-            'measures': 16,
-            'has_drums': True,
-        },
-        LofiStyle.SLEEP: {
-            'name': 'Sleep/Ambient Lo-Fi',
-            'description': 'Andamento lento, bateria sutil, acordes sustentados',
-            'bpm_range': (60, 70),
-            'key_preferences': ['A', 'E', 'D', 'G'],
-            'mode': 'minor',
-            'measures': 24,
-            'has_drums': False,
-        },
-        LofiStyle.AMBIENT: {
-            'name': 'Ambient Lo-Fi',
-            'description': 'Atmosférico, foco em texturas e pads',
-            'bpm_range': (60, 70),
-            'key_preferences': ['A', 'E', 'D'],
-            'mode': 'minor',
-            'measures': 24,
-            'has_drums': False,
-        },
-        LofiStyle.SAD: {
-            'name': 'Sad Lo-Fi',
-            'description': 'Progressões em tons menores, melodias melancólicas',
-            'bpm_range': (70, 80),
-            'key_preferences': ['Am', 'Dm', 'Em', 'Bm'],
-            'mode': 'minor',
-            'measures': 16,
-            'has_drums': True,
-            'instruments': ['piano', 'bass', 'pad', 'strings', 'melody']
-        },
-        LofiStyle.NOSTALGIC: {
-            'name': 'Nostalgic Lo-Fi',
-            'description': 'Melodias espaçadas e emotivas, progressões nostálgicas',
-            'bpm_range': (70, 80),
-            'key_preferences': ['C', 'G', 'D', 'A'],
-            'mode': 'minor',
-            'measures': 16,
-            'has_drums': True,
-            'instruments': ['piano', 'bass', 'guitar', 'flute']
-        },
-        LofiStyle.ORIENTAL: {
-            'name': 'Oriental Lo-Fi',
-            'description': 'Escalas pentatônicas com Koto e Shakuhachi',
-            'bpm_range': (65, 75),
-            'key_preferences': ['Am', 'Dm', 'Em'],
-            'mode': 'pentatonic_minor',
-            'measures': 16,
-            'has_drums': True,
-            'instruments': ['piano', 'bass', 'koto', 'shakuhachi']
-        },
-        LofiStyle.NORDESTE: {
-            'name': 'Nordeste Lo-Fi (Baiao-Hop)',
-            'description': 'Ritmos nordestinos com Sanfona e escala Lídio b7',
-            'bpm_range': (80, 95),
-            'key_preferences': ['G', 'D', 'A'],
-            'mode': 'lydian_b7',
-            'measures': 16,
-            'has_drums': True,
-            'instruments': ['piano', 'bass', 'accordion']
-        },
-    }
+    STYLE_PRESETS = STYLE_PRESETS
     
-    def __init__(self, output_dir: str = './output'):
+    def __init__(self, output_dir: str = './output', seed: Optional[int] = None):
         self.output_dir = output_dir
-        os.makedirs(output_dir, exist_ok=True)
+        self._output_path = Path(output_dir)
+        self._output_path.mkdir(parents=True, exist_ok=True)
+        # Todas as escolhas aleatórias do engine saem deste gerador (reprodutível com seed)
+        self.rng = np.random.default_rng(seed)
         self.renderer = AudioRenderer()
-        self.processor = PostProcessor()
+        self.processor = PostProcessor(seed=seed)
     
     def _parse_key_and_mode(self, key_str: str) -> tuple:
+        parsed = _KEY_MODE_TABLE.get(key_str)
+        if parsed is not None:
+            return parsed
+        # Grafias fora da tabela (vindas do --key) seguem a regra antiga
         if key_str.endswith('m'):
             return key_str[:-1], 'minor'
         return key_str, 'major'
     
+    def _base_name(self, preset: dict, key: str, mode: str, bpm: int) -> str:
+        return f"lofi_{preset['slug']}_{key}{mode[0]}_{bpm}bpm"
+    
+    def _draw_style_choices(self, styles: List[LofiStyle]) -> List[dict]:
+        """
+        Sorteia tom, BPM, progressão e semente de todas as faixas em um único lote,
+        antes de despachá-las (a ordem de execução não muda o resultado).
+        """
+        progs = LofiMidiGenerator.MELANCHOLIC_PROGRESSIONS
+        draws = self.rng.random((len(styles), 3)).tolist()
+        seeds = self.rng.integers(0, 2**32, len(styles)).tolist()
+        choices = []
+        for style, (k, b, p), seed in zip(styles, draws, seeds):
+            preset = self.STYLE_PRESETS[style]
+            keys = preset['key_preferences']
+            bpm_min, bpm_max = preset['bpm_range']
+            choices.append({
+                'key': keys[int(k * len(keys))],
+                'bpm': bpm_min + int(b * (bpm_max - bpm_min + 1)),
+                'prog': progs[int(p * len(progs))],
+                'seed': seed,
+            })
+        return choices
+    
     def generate_track(self, 
                       style: LofiStyle,
                       key: Optional[str] = None,
@@ -119,21 +208,45 @@ class LofiEngine:
                       measures: Optional[int] = None,
                       include_drums: Optional[bool] = None,
                       filename: Optional[str] = None,
-                      render_audio: bool = True) -> str:
+                      render_audio: bool = True,
+                      prog: Optional[List] = None,
+                      seed: Optional[int] = None) -> str:
         """
         Gera uma faixa Lo-Fi completa (MIDI -> WAV Masterizado).
         """
+        midi_path = self._compose_midi(style, key, bpm, measures, include_drums, filename, prog, seed)
+        
+        # 2. Renderização de Áudio e Pós-Produção
+        if render_audio:
+            try:
+                return self._master(midi_path, self._render_clean(midi_path))
+            except Exception as e:
+                logger.error(f"✗ Erro na renderização/pós-produção: {e}")
+        
+        return midi_path
+
+    def _compose_midi(self,
+                      style: LofiStyle,
+                      key: Optional[str] = None,
+                      bpm: Optional[int] = None,
+                      measures: Optional[int] = None,
+                      include_drums: Optional[bool] = None,
+                      filename: Optional[str] = None,
+                      prog: Optional[List] = None,
+                      seed: Optional[int] = None) -> str:
+        """Etapa 1 do pipeline: monta e salva o MIDI, retornando o caminho."""
         preset = self.STYLE_PRESETS[style]
         
         if key is None:
-            key_choice = random.choice(preset['key_preferences'])
+            keys = preset['key_preferences']
+            key_choice = keys[self.rng.integers(len(keys))]
             key, mode = self._parse_key_and_mode(key_choice)
         else:
             key, mode = self._parse_key_and_mode(key)
         
         if bpm is None:
             bpm_min, bpm_max = preset['bpm_range']
-            bpm = random.randint(bpm_min, bpm_max)
+            bpm = int(self.rng.integers(bpm_min, bpm_max + 1))
         
         if measures is None:
             measures = preset['measures']
@@ -142,75 +255,227 @@ class LofiEngine:
             include_drums = preset['has_drums']
         
         if filename is None:
-            base_name = f"lofi_{preset['name'].lower().replace('/', '_').replace(' ', '_')}_{key}{mode[0]}_{bpm}bpm"
+            base_name = self._base_name(preset, key, mode, bpm)
         else:
             base_name = filename.replace('.mid', '')
             
-        midi_path = os.path.join(self.output_dir, f"{base_name}.mid")
+        midi_path = os.fspath(self._output_path / f"{base_name}.mid")
         
-        # 1. Geração MIDI
+        # 1. Geração MIDI (a track de tempo vem pronta do esqueleto do BPM)
         mid = MidiFile(ticks_per_beat=480)
+        mid.tracks.append(_build_scaffold(bpm))
         
-        # Track de tempo
-        tempo_track = MidiTrack()
-        mid.tracks.append(tempo_track)
-        tempo_track.append(MetaMessage('set_tempo', tempo=mido.bpm2tempo(bpm), time=0))
-        tempo_track.append(MetaMessage('time_signature', numerator=4, denominator=4, clocks_per_click=24, notated_32nd_notes_per_beat=8, time=0))
-        
-        print(f"Gerando {preset['name']} - Key: {key} {mode}, BPM: {bpm}, Measures: {measures}")
+        logger.info(f"Gerando {preset['name']} - Key: {key} {mode}, BPM: {bpm}, Measures: {measures}")
         
-        generator = LofiMidiGenerator(key=key, mode=mode)
-        generator.bpm = bpm
-        prog = random.choice(generator.MELANCHOLIC_PROGRESSIONS)
+        if prog is None:
+            progs = LofiMidiGenerator.MELANCHOLIC_PROGRESSIONS
+            prog = progs[self.rng.integers(len(progs))]
         
         # Adicionar as tracks baseadas no preset ou padrão
         instruments = preset.get('instruments', ['piano', 'bass', 'pad', 'melody'])
-        generator.generate_full_ensemble(mid, prog, measures, instruments)
         
+        # As tracks são independentes: cada uma ganha o próprio gerador aleatório, derivado
+        # da semente mestre por SeedSequence.spawn (streams que não se sobrepõem entre
+        # tracks nem entre faixas), e roda em paralelo sem compartilhar estado
+        master_seed = int(self.rng.integers(0, 2**32)) if seed is None else seed
+        names = [n for n in LofiMidiGenerator.TRACK_METHODS if n in instruments]
+        track_seeds = np.random.SeedSequence(master_seed).spawn(len(names) + 1)
+        generator = _get_generator(key, mode)
+        tasks = [partial(getattr(generator, LofiMidiGenerator.TRACK_METHODS[name]), mid, prog, measures,
+                         rng=np.random.default_rng(track_seed))
+                 for name, track_seed in zip(names, track_seeds)]
         if include_drums:
-            drum_gen = DrumGenerator(style=style, bpm=bpm)
-            mid.tracks.append(drum_gen.generate_drum_track(mid, measures=measures))
-            print(f"  ✓ Bateria adicionada com sincronia de grade")
+            drum_gen = DrumGenerator(style=style, bpm=bpm, seed=track_seeds[-1])
+            # A bateria já sai em bytes de MTrk, codificada direto dos arrays de eventos
+            tasks.append(partial(drum_gen.encode_drum_track, mid.ticks_per_beat, measures))
         
-        mid.save(midi_path)
-        print(f"  ✓ Arquivo MIDI salvo: {midi_path}")
+        with ThreadPoolExecutor(max_workers=len(tasks)) as executor:
+            futures = [executor.submit(task) for task in tasks]
+            # Ordem fixa (harmonia, baixo, pad, melodia, bateria): o MIDI sai reproduzível
+            results = [future.result() for future in futures]
         
-        # 2. Renderização de Áudio e Pós-Produção
-        if render_audio:
-            try:
-                # Renderiza MIDI para WAV (Limpo)
-                clean_wav = midi_path.replace('.mid', '_clean.wav')
-                self.renderer.render(midi_path, clean_wav)
-                
-                # Pós-processamento (Filtros + Camadas)
-                final_wav = midi_path.replace('.mid', '_final_master.wav')
-                self.processor.process(clean_wav, final_wav)
-                
-                # Limpa o arquivo intermediário
-                if os.path.exists(clean_wav):
-                    os.remove(clean_wav)
-                
-                print(f"✓ Masterização completa: {final_wav}")
-                return final_wav
-            except Exception as e:
-                print(f"✗ Erro na renderização/pós-produção: {e}")
+        raw_tracks = []
+        if include_drums:
+            raw_tracks.append(results.pop())
+            logger.info(f"  ✓ Bateria adicionada com sincronia de grade")
+        mid.tracks.extend(results)
         
+        fast_save(mid, midi_path, raw_tracks)
+        logger.info(f"  ✓ Arquivo MIDI salvo: {midi_path}")
+        _flush_logs()
         return midi_path
 
-    def generate_all_styles(self, measures: int = 8) -> List[str]:
+    def _render_clean(self, midi_path: str) -> np.ndarray:
+        """
+        Etapa 2 do pipeline: renderiza o MIDI (Limpo) direto para a memória.
+        O áudio limpo segue para a pós-produção sem passar por um _clean.wav em disco.
+        """
+        try:
+            return self.renderer.render_to_array(midi_path)
+        finally:
+            _flush_logs()
+
+    def _master(self, midi_path: str, clean: np.ndarray) -> str:
+        """Etapa 3 do pipeline: pós-processamento (Filtros + Camadas) do áudio limpo."""
+        final_wav = midi_path.replace('.mid', '_final_master.wav')
+        self.processor.process_array(clean, final_wav, SAMPLE_RATE)
+        
+        logger.info(f"✓ Masterização completa: {final_wav}")
+        _flush_logs()
+        return final_wav
+
+    def _generate_pipelined(self, styles: List[LofiStyle], measures: int,
+                            choices: Dict[LofiStyle, dict]) -> Dict[LofiStyle, str]:
+        """
+        Gera os estilos em um pipeline de 3 threads (MIDI -> render -> pós-produção) ligadas
+        por filas: enquanto uma faixa é masterizada, a seguinte já está no FluidSynth e a
+        outra sendo composta. As filas limitadas seguram no máximo 2 faixas por etapa.
+        """
+        fim = object()  # Sentinela que avisa a etapa seguinte que não vem mais nada
+        midis = queue.Queue(maxsize=2)
+        cleans = queue.Queue(maxsize=2)
+        results = {}
+
+        def midi_worker():
+            for style in styles:
+                logger.info(f"\n[{style.value.upper()}]")
+                try:
+                    midis.put((style, self._compose_midi(style, measures=measures, **choices[style])))
+                except Exception as e:
+                    logger.error(f"  ✗ Erro ao gerar {style.value}: {e}")
+            midis.put(fim)
+
+        def render_worker():
+            for style, midi_path in iter(midis.get, fim):
+                # Como no generate_track, se o áudio falhar fica ao menos o MIDI
+                results[style] = midi_path
+                try:
+                    cleans.put((style, midi_path, self._render_clean(midi_path)))
+                except Exception as e:
+                    logger.error(f"✗ Erro na renderização/pós-produção: {e}")
+            cleans.put(fim)
+
+        def post_worker():
+            for style, midi_path, clean in iter(cleans.get, fim):
+                try:
+                    results[style] = self._master(midi_path, clean)
+                except Exception as e:
+                    logger.error(f"✗ Erro na renderização/pós-produção: {e}")
+
+        threads = [threading.Thread(target=worker) for worker in (midi_worker, render_worker, post_worker)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def generate_all_styles(self, measures: int = 8, workers: Optional[int] = None) -> List[str]:
+        """
+        Gera uma faixa de cada estilo. Os estilos são independentes, então cada um roda
+        em um processo próprio (MIDI, FluidSynth e pós-produção fora do GIL).
+        Com um único worker, as etapas das faixas se sobrepõem em pipeline.
+        """
+        generated_files = {}
+        logger.info("=" * 60)
+        logger.info("GERADOR DE MÚSICAS LO-FI - PIPELINE COMPLETO")
+        logger.info("=" * 60)
+        styles = list(LofiStyle)
+        workers = min(len(styles), workers or os.cpu_count() or 1)
+        choices = dict(zip(styles, self._draw_style_choices(styles)))
+        if workers <= 1:
+            generated_files = self._generate_pipelined(styles, measures, choices)
+        else:
+            # Os workers mandam os logs por uma fila; uma única thread aqui os escreve
+            log_queue = multiprocessing.Queue()
+            listener = QueueListener(log_queue, *logging.getLogger().handlers)
+            listener.start()
+            try:
+                with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker_logging,
+                                         initargs=(log_queue,)) as executor:
+                    futures = {executor.submit(_generate_one, style, measures, self.output_dir, choices[style]): style
+                               for style in styles}
+                    for future in as_completed(futures):
+                        style = futures[future]
+                        try:
+                            generated_files[style] = future.result()
+                        except Exception as e:
+                            logger.error(f"  ✗ Erro ao gerar {style.value}: {e}")
+                        _flush_logs()
+            finally:
+                listener.stop()
+        # Mantém a ordem dos estilos, independente de qual processo terminou primeiro
+        return [generated_files[style] for style in styles if style in generated_files]
+
+
+    def generate_variations(self, style: LofiStyle, count: int = 3,
+                            measures: Optional[int] = None,
+                            key: Optional[str] = None,
+                            bpm: Optional[int] = None,
+                            include_drums: Optional[bool] = None,
+                            render_audio: bool = True) -> List[str]:
+        """
+        Gera várias versões do mesmo estilo (tom, BPM e progressão sorteados para cada uma;
+        key/bpm, quando dados, valem para todas). O sufixo _v1, _v2... evita que duas
+        versões no mesmo tom e BPM se sobrescrevam.
+        """
+        preset = self.STYLE_PRESETS[style]
         generated_files = []
-        print("=" * 60)
-        print("GERADOR DE MÚSICAS LO-FI - PIPELINE COMPLETO")
-        print("=" * 60)
-        for style in LofiStyle:
-            print(f"\n[{style.value.upper()}]")
+        for i, choices in enumerate(self._draw_style_choices([style] * count)):
+            if key is not None:
+                choices['key'] = key
+            if bpm is not None:
+                choices['bpm'] = bpm
+            key_name, mode = self._parse_key_and_mode(choices['key'])
+            filename = f"{self._base_name(preset, key_name, mode, choices['bpm'])}_v{i + 1}"
             try:
-                filepath = self.generate_track(style=style, measures=measures)
-                generated_files.append(filepath)
+                generated_files.append(self.generate_track(style=style, measures=measures,
+                                                           filename=filename, include_drums=include_drums,
+                                                           render_audio=render_audio, **choices))
             except Exception as e:
-                print(f"  ✗ Erro ao gerar {style.value}: {e}")
+                logger.error(f"  ✗ Erro ao gerar variação {i + 1} de {style.value}: {e}")
         return generated_files
 
+    @classmethod
+    def list_styles(cls) -> List[tuple]:
+        """Retorna (estilo, nome, descrição) de cada preset disponível."""
+        return [(style.value, preset['name'], preset['description'])
+                for style, preset in cls.STYLE_PRESETS.items()]
+
+
+def _init_worker_logging(log_queue) -> None:
+    """Nos processos worker, todo log vai para a fila do processo principal."""
+    root = logging.getLogger()
+    root.handlers[:] = [QueueHandler(log_queue)]
+    root.setLevel(logging.INFO)
+
+
+def _flush_logs() -> None:
+    """Descarrega o buffer do MemoryHandler ao fim de cada etapa da faixa, para o progresso sair em dia."""
+    for handler in logging.getLogger().handlers:
+        handler.flush()
+
+
+def _configure_logging() -> None:
+    # Mensagens acumuladas em lotes de 100 (erros saem na hora) em vez de um write por linha;
+    # cada etapa do pipeline descarrega o lote ao terminar (_flush_logs)
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    root = logging.getLogger()
+    root.addHandler(MemoryHandler(capacity=100, flushLevel=logging.ERROR, target=handler))
+    root.setLevel(logging.INFO)
+
+
+def _generate_one(style: LofiStyle, measures: int, output_dir: str, choices: dict) -> str:
+    """
+    Gera um estilo em um processo worker. Fica no nível do módulo para ser serializável;
+    cada processo monta seu próprio engine (e com ele seu AudioRenderer/PostProcessor).
+    As escolhas aleatórias já vêm sorteadas pelo engine principal; a seed da faixa também
+    semeia o engine do worker, para o sorteio das texturas ser reprodutível.
+    """
+    logger.info(f"\n[{style.value.upper()}]")
+    engine = LofiEngine(output_dir=output_dir, seed=choices['seed'])
+    return engine.generate_track(style=style, measures=measures, **choices)
+
 
 def main():
     parser = argparse.ArgumentParser(description='Gerador de Músicas Lo-Fi - Pipeline Completo')
@@ -222,20 +487,36 @@ def main():
     parser.add_argument('--no-audio', action='store_true', help='Apenas MIDI, sem renderizar áudio')
     parser.add_argument('--output', type=str, default='./output', help='Diretório de saída')
     parser.add_argument('--all', action='store_true', help='Gerar todos os estilos')
+    parser.add_argument('--variations', type=int, help='Gerar N versões do --style')
     parser.add_argument('--list', action='store_true', help='Listar estilos')
+    parser.add_argument('--seed', type=int, help='Semente para gerar faixas reproduzíveis')
+    parser.add_argument('--workers', type=int, help='Processos em paralelo no --all (padrão: um por núcleo)')
     
     args = parser.parse_args()
+    _configure_logging()
     
     if args.list:
         print("\nEstilos de Lo-Fi disponíveis:\n")
-        for style, preset in LofiEngine.STYLE_PRESETS.items():
-            print(f"  • {preset['name']}: {preset['description']}")
+        for _, name, description in LofiEngine.list_styles():
+            print(f"  • {name}: {description}")
         return
     
-    engine = LofiEngine(output_dir=args.output)
+    engine = LofiEngine(output_dir=args.output, seed=args.seed)
     
     if args.all:
-        engine.generate_all_styles(measures=args.measures)
+        engine.generate_all_styles(measures=args.measures, workers=args.workers)
+        return
+    
+    if args.style and args.variations:
+        engine.generate_variations(
+            LofiStyle(args.style),
+            count=args.variations,
+            measures=args.measures,
+            key=args.key,
+            bpm=args.bpm,
+            include_drums=not args.no_drums,
+            render_audio=not args.no_audio
+        )
         return
     
     if args.style:
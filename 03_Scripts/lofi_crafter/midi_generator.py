@@ -4,12 +4,20 @@ Implementa tracks de Piano, Bass, Pad, Violino, Guitarra Jazz, Flauta, Sanfona,
 Foco em escalas Pentatônicas (Oriental) e Mixolídia/Lídio b7 (Nordeste).
 """
 
-import random
+import os
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from types import MappingProxyType
+
+import numpy as np
 import mido
 from mido import MidiFile, MidiTrack, Message, MetaMessage
 from typing import List, Tuple, Dict, Optional
 from enum import Enum
 
+from midi_writer import encode_file, encode_note_arrays, note_messages
+
 
 class LofiStyle(Enum):
     CHILLHOP = "chillhop"
@@ -22,273 +30,564 @@ class LofiStyle(Enum):
     NORDESTE = "nordeste"
 
 
-class ChordQuality(Enum):
-    MINOR7 = [0, 3, 7, 10]
-    MINOR9 = [0, 3, 7, 10, 14]
-    MAJOR7 = [0, 4, 7, 11]
-    DOMINANT7 = [0, 4, 7, 10]
-    MINOR7B5 = [0, 3, 6, 10]
-    SUS4 = [0, 5, 7]
+# Nota -> classe de altura (0 = C), criado uma vez e somente leitura
+_KEY_MAP = MappingProxyType({'C': 0, 'C#': 1, 'Db': 1, 'D': 2, 'D#': 3, 'Eb': 3, 'E': 4, 'F': 5, 'F#': 6, 'Gb': 6,
+                             'G': 7, 'G#': 8, 'Ab': 8, 'A': 9, 'A#': 10, 'Bb': 10, 'B': 11})
+
+# Qualidades de acorde: intervalos (em semitons) como tuplas imutáveis, referenciadas
+# nas progressões pelo índice inteiro
+CHORD_QUALITIES: Tuple[Tuple[int, ...], ...] = (
+    (0, 3, 7, 10),      # MINOR7
+    (0, 3, 7, 10, 14),  # MINOR9
+    (0, 4, 7, 11),      # MAJOR7
+    (0, 4, 7, 10),      # DOMINANT7
+    (0, 3, 6, 10),      # MINOR7B5
+    (0, 5, 7),          # SUS4
+)
+MINOR7_Q, MINOR9_Q, MAJOR7_Q, DOMINANT7_Q, MINOR7B5_Q, SUS4_Q = range(len(CHORD_QUALITIES))
+
+# As mesmas qualidades numa tabela (qualidade, voz) completada com -1, montada uma vez
+# no import: as tracks indexam linhas pelo índice da qualidade
+MAX_CHORD = max(len(intervals) for intervals in CHORD_QUALITIES)
+CHORD_LEN = np.array([len(intervals) for intervals in CHORD_QUALITIES], dtype=np.int64)
+CHORD_TABLE = np.full((len(CHORD_QUALITIES), MAX_CHORD), -1, dtype=np.int8)
+for _q, _intervals in enumerate(CHORD_QUALITIES):
+    CHORD_TABLE[_q, :len(_intervals)] = _intervals
+
+# Tríade dos pads por qualidade: fundamental, segunda voz e terceira voz (quinta justa
+# quando o acorde não tem terceira voz)
+CHORD_PAD_TABLE = np.array([[q[0], q[1], q[2] if len(q) > 2 else 7] for q in CHORD_QUALITIES], dtype=np.int8)
+
+# Progressão já convertida em arrays (ver _encode_prog)
+ProgArrays = namedtuple('ProgArrays', ['degrees', 'intervals', 'sizes', 'triads'])
+
+
+@lru_cache(maxsize=64)
+def _encode_prog_tuple(prog):
+    degrees = np.array([degree for degree, _ in prog], dtype=np.int64)
+    qualities = np.array([quality for _, quality in prog], dtype=np.int64)
+    encoded = ProgArrays(degrees, CHORD_TABLE[qualities], CHORD_LEN[qualities], CHORD_PAD_TABLE[qualities])
+    for arr in encoded:
+        arr.flags.writeable = False
+    return encoded
+
+
+def _encode_prog(prog):
+    """
+    Converte a progressão [(grau, índice em CHORD_QUALITIES), ...] em arrays: graus, intervalos
+    (len(prog), MAX_CHORD) completados com -1, o tamanho de cada acorde e a tríade do pad. As progressões
+    são poucas e fixas, então cada uma é convertida uma vez e reaproveitada (somente leitura).
+    """
+    return _encode_prog_tuple(tuple(prog))
+
+
+def _humanize_velocity(rng, base_vel: int, variance: int, size: int) -> np.ndarray:
+    """Velocities base ± variance sorteadas de uma vez para size notas, limitadas a 30..110."""
+    return np.clip(base_vel + rng.integers(-variance, variance + 1, size), 30, 110)
+
+
+def _humanize_time(rng, variance: int, size: int) -> np.ndarray:
+    """Deslocamentos de ± variance ticks para size notas, num único sorteio (int16: são só dezenas de ticks)."""
+    return rng.integers(-variance, variance + 1, size).astype(np.int16)
+
+
+def _event_buffers(n):
+    """
+    Arrays pré-alocados de n eventos: tick (int32), kind (0 = note_off, 1 = note_on), note e
+    vel (uint8). Todo o tempo das tracks fica em int32 contíguo, do grid até a ordenação.
+    """
+    return np.empty(n, np.int32), np.empty(n, np.uint8), np.empty(n, np.uint8), np.empty(n, np.uint8)
+
+
+def _event_key(ticks, kinds, notes):
+    """Chave inteira de ordenação: tick, offs antes de ons no mesmo tick, e nota."""
+    return (ticks.astype(np.int64) * 2 + kinds) * 128 + notes
+
+
+def _merge_runs(events, n):
+    """
+    Intercala os eventos [:n] e [n:] quando cada metade já está em ordem (ons e offs de
+    notas em sequência), por searchsorted em vez de ordenar tudo. O resultado é o mesmo
+    da ordenação estável; se alguma metade estiver fora de ordem (ex.: acordes humanizados),
+    os eventos voltam como estão e o _emit_events ordena.
+    """
+    key = _event_key(*events[:3])
+    first, second = key[:n], key[n:]
+    if np.any(first[1:] < first[:-1]) or np.any(second[1:] < second[:-1]):
+        return events
+    pos = np.empty(key.size, dtype=np.int64)
+    pos[:n] = np.arange(n) + np.searchsorted(second, first, side='left')
+    pos[n:] = np.arange(key.size - n) + np.searchsorted(first, second, side='right')
+    merged = _event_buffers(key.size)
+    for out, arr in zip(merged, events):
+        out[pos] = arr
+    return merged
+
+
+def _note_pairs(on_ticks, off_ticks, notes, vels):
+    """
+    Preenche por fatias os ons e, em seguida, os offs de um conjunto de notas, e
+    intercala as duas sequências em ordem de tempo quando possível (_merge_runs).
+    """
+    n = len(notes)
+    ticks, kinds, note_arr, vel_arr = events = _event_buffers(2 * n)
+    ticks[:n] = on_ticks
+    ticks[n:] = off_ticks
+    kinds[:n] = 1
+    kinds[n:] = 0
+    note_arr[:n] = notes
+    note_arr[n:] = notes
+    vel_arr[:n] = vels
+    vel_arr[n:] = 0
+    return _merge_runs(events, n)
+
+
+def _beat_grid(measures, ticks_per_beat, half_beats, measure_step=1):
+    """
+    Ticks (compassos, posições) das posições de cada compasso, dadas em meios tempos
+    (3 = tempo 1.5), e o índice do compasso. Só aritmética inteira: sem floats nem int().
+    """
+    m = np.arange(0, measures, measure_step, dtype=np.int32)
+    offsets = np.array(half_beats, dtype=np.int32) * ticks_per_beat // 2
+    return m[:, None] * ticks_per_beat * 4 + offsets, np.broadcast_to(m[:, None], (len(m), len(half_beats)))
+
+
+# Construtores de eventos de cada track: recebem a tabela de notas, a progressão já em
+# arrays (_encode_prog), a resolução, o número de compassos e o gerador numpy, e devolvem
+# (ticks, kinds, notes, vels) sem ordenar. Não dependem de mido nem da instância.
+
+def _build_harmony(note_lut, prog_arrays, ticks_per_beat, measures, rng):
+    degrees, intervals, sizes = prog_arrays.degrees, prog_arrays.intervals, prog_arrays.sizes
+    ticks_per_measure = ticks_per_beat * 4
+    period = len(degrees)
+
+    # Um ciclo da progressão calculado uma vez: notas de cada acorde (só as vozes que
+    # existem) e o compasso do ciclo a que pertencem
+    voices = np.arange(MAX_CHORD) < sizes[:, None]
+    cycle_notes = (note_lut[degrees - 1, 3, None] + intervals)[voices]
+    cycle_measure = np.broadcast_to(np.arange(period)[:, None], voices.shape)[voices]
+
+    # O ciclo é repetido até cobrir os compassos; só os ticks (e a humanização) mudam
+    cycles = -(-measures // period)
+    measure = (np.arange(cycles)[:, None] * period + cycle_measure).ravel()
+    in_range = measure < measures
+    notes = np.tile(cycle_notes, cycles)[in_range]
+    starts = (measure[in_range] * ticks_per_measure).astype(np.int32)
+
+    # Humanização sorteada de uma vez para todas as notas
+    h_on = starts + _humanize_time(rng, 40, notes.size)
+    np.maximum(h_on, 0, out=h_on)
+    vels = _humanize_velocity(rng, 45, 10, notes.size)
+    return _note_pairs(h_on, starts + ticks_per_measure - 60, notes, vels)
+
+
+def _build_bass(note_lut, prog_arrays, ticks_per_beat, measures, rng):
+    degrees = prog_arrays.degrees
+    starts, m = _beat_grid(measures, ticks_per_beat, [0, 3])
+    starts, m = starts.ravel(), m.ravel()
+    notes = note_lut[degrees[m % len(degrees)] - 1, 2]
+    h_on = starts + _humanize_time(rng, 20, starts.size)
+    np.maximum(h_on, 0, out=h_on)
+    vels = _humanize_velocity(rng, 70, 10, starts.size)
+    return _note_pairs(h_on, starts + ticks_per_beat * 4 // 5, notes, vels)
+
+
+def _build_pad(note_lut, prog_arrays, ticks_per_beat, measures, rng):
+    degrees = prog_arrays.degrees
+    ticks_per_measure = ticks_per_beat * 4
+    # Tríades de um ciclo da progressão, repetidas por indexação para todos os compassos
+    cycle = note_lut[degrees - 1, 4, None].astype(np.int64) + prog_arrays.triads
+    chords = cycle[np.arange(measures) % len(degrees)]
+
+    # Sem humanização, os eventos já nascem em ordem: cada compasso grava (compasso, on/off,
+    # voz) os ons no seu início e os offs no início do seguinte, que ficam antes dos ons
+    # do próximo acorde; as vozes já estão em ordem crescente de nota
+    events = _event_buffers(6 * measures)
+    ticks, kinds, notes, vels = (arr.reshape(measures, 2, 3) for arr in events)
+    ticks[:] = (np.arange(measures)[:, None] + np.arange(2))[:, :, None] * ticks_per_measure
+    kinds[:] = np.array([1, 0])[:, None]
+    notes[:] = chords[:, None, :]
+    vels[:] = np.array([35, 0])[:, None]
+    return events
+
+
+def _build_koto(note_lut, prog_arrays, ticks_per_beat, measures, rng):
+    degrees = prog_arrays.degrees
+    starts, m = _beat_grid(measures, ticks_per_beat, [0, 1, 4, 5])
+    keep = rng.random(starts.shape) < 0.7
+    starts, m = starts[keep], m[keep]
+    # Usa apenas notas da escala pentatônica para autenticidade
+    notes = note_lut[degrees[m % len(degrees)] + rng.integers(0, 5, starts.size) - 1, 5]
+    return _note_pairs(starts, starts + 120, notes, np.full(starts.size, 60))
+
+
+def _build_accordion(note_lut, prog_arrays, ticks_per_beat, measures, rng):
+    degrees = prog_arrays.degrees
+    starts, m = _beat_grid(measures, ticks_per_beat, [1, 2, 5, 6])
+    keep = rng.random(starts.shape) < 0.6
+    starts, m = starts[keep], m[keep]
+    # Melodia com "puxadas" de fole características (notas duplas/terças)
+    root = note_lut[degrees[m % len(degrees)] - 1, 5].astype(np.int64)
+    notes = np.stack([root, root + 4], axis=1).ravel()
+    starts = np.repeat(starts, 2)
+    return _note_pairs(starts, starts + ticks_per_beat * 2 // 5, notes, np.full(notes.size, 55))
+
+
+def _build_shakuhachi(note_lut, prog_arrays, ticks_per_beat, measures, rng):
+    degrees = prog_arrays.degrees
+    starts, m = _beat_grid(measures, ticks_per_beat, [4], measure_step=2)
+    keep = rng.random(starts.shape) < 0.5
+    starts, m = starts[keep], m[keep]
+    notes = note_lut[degrees[m % len(degrees)] - 1, 6]
+    # Voz monofônica: cada nota termina antes da próxima começar, então intercalar
+    # on/off nota a nota já dá a ordem final
+    events = _event_buffers(2 * starts.size)
+    ticks, kinds, note_arr, vels = (arr.reshape(-1, 2) for arr in events)
+    ticks[:] = starts[:, None] + np.array([0, ticks_per_beat * 2])
+    kinds[:] = [1, 0]
+    note_arr[:] = notes[:, None]
+    vels[:] = [45, 0]
+    return events
+
+
+def _build_melody(note_lut, prog_arrays, ticks_per_beat, measures, rng):
+    degrees, intervals, sizes = prog_arrays.degrees, prog_arrays.intervals, prog_arrays.sizes
+    starts, m = _beat_grid(measures, ticks_per_beat, [1, 4, 7])
+    keep = rng.random(starts.shape) < 0.6
+    starts, chord_idx = starts[keep], m[keep] % len(degrees)
+    # Uma nota qualquer do acorde, uma oitava acima
+    voice = rng.integers(0, sizes[chord_idx])
+    notes = note_lut[degrees[chord_idx] - 1, 4] + intervals[chord_idx, voice] + 12
+    return _note_pairs(starts, starts + ticks_per_beat * 6 // 5, notes, np.full(starts.size, 75))
+
+
+# Instrumento -> construtor de eventos. Funções de módulo (não métodos) para poderem ser
+# enviadas a um ProcessPoolExecutor: argumentos e resultado são só arrays e inteiros
+TRACK_BUILDERS = {
+    'piano': _build_harmony,
+    'bass': _build_bass,
+    'pad': _build_pad,
+    'koto': _build_koto,
+    'accordion': _build_accordion,
+    'shakuhachi': _build_shakuhachi,
+    'melody': _build_melody,
+}
+
+
+def _sort_events(ticks, kinds, notes, vels):
+    """
+    Ordena os eventos e devolve (deltas, kinds, notes, vels). Cada evento vira um único
+    int64 (tick | kind | nota | velocity, do bit mais alto ao mais baixo): a ordem desses
+    inteiros é a do antigo sort de tuplas (tick, offs antes de ons, nota), então basta um
+    np.sort dos valores, sem argsort nem reindexar quatro arrays, e desempacotar por shifts.
+    Eventos que o construtor já gerou ou intercalou em ordem não passam pela ordenação.
+    """
+    packed = (_event_key(ticks, kinds, notes) << 7) | np.asarray(vels, dtype=np.int64)
+    if np.any(packed[1:] < packed[:-1]):
+        packed = np.sort(packed)
+    ticks = packed >> 15
+    return np.diff(ticks, prepend=0), (packed >> 14) & 1, (packed >> 7) & 0x7F, packed & 0x7F
+
+
+def _emit_events(track, ticks, kinds, notes, vels, channel):
+    """Ordena os eventos (_sort_events) e anexa as mensagens à track."""
+    track.extend(note_messages(*_sort_events(ticks, kinds, notes, vels), channel=channel))
+    return track
+
+
+def _encode_events(prefix, ticks, kinds, notes, vels) -> bytes:
+    """
+    Mesma track do _emit_events (program change + notas), mas já como corpo de MTrk,
+    direto dos arrays e sem nenhum objeto Message por evento.
+    """
+    deltas, kinds, notes, vels = _sort_events(ticks, kinds, notes, vels)
+    status = np.where(kinds == 1, 0x90, 0x80) | prefix.channel
+    return b'\x00' + bytes(prefix.bytes()) + encode_note_arrays(deltas, status, notes, vels)
 
 
 class LofiMidiGenerator:
     """Gerador MIDI multi-instrumental com foco em melancolia e influências culturais."""
     
-    SCALES = {
-        'minor': [0, 2, 3, 5, 7, 8, 10],
-        'dorian': [0, 2, 3, 5, 7, 9, 10],
-        'pentatonic_minor': [0, 3, 5, 7, 10], # Base para Oriental
-        'lydian_b7': [0, 2, 4, 6, 7, 9, 10], # Base para Nordeste (Mixolídia com 4#)
-    }
+    SCALES = MappingProxyType({
+        'minor': (0, 2, 3, 5, 7, 8, 10),
+        'dorian': (0, 2, 3, 5, 7, 9, 10),
+        'pentatonic_minor': (0, 3, 5, 7, 10), # Base para Oriental
+        'lydian_b7': (0, 2, 4, 6, 7, 9, 10), # Base para Nordeste (Mixolídia com 4#)
+    })
 
     MELANCHOLIC_PROGRESSIONS = [
-        [(1, ChordQuality.MINOR9), (4, ChordQuality.MINOR7), (7, ChordQuality.DOMINANT7), (3, ChordQuality.MAJOR7)],
-        [(1, ChordQuality.MINOR7), (6, ChordQuality.MAJOR7), (2, ChordQuality.MINOR7B5), (5, ChordQuality.DOMINANT7)],
-        [(6, ChordQuality.MAJOR7), (5, ChordQuality.DOMINANT7), (1, ChordQuality.MINOR9), (1, ChordQuality.MINOR7)],
-        [(1, ChordQuality.MINOR7), (4, ChordQuality.MINOR9), (1, ChordQuality.MINOR7), (4, ChordQuality.MINOR7)],
+        [(1, MINOR9_Q), (4, MINOR7_Q), (7, DOMINANT7_Q), (3, MAJOR7_Q)],
+        [(1, MINOR7_Q), (6, MAJOR7_Q), (2, MINOR7B5_Q), (5, DOMINANT7_Q)],
+        [(6, MAJOR7_Q), (5, DOMINANT7_Q), (1, MINOR9_Q), (1, MINOR7_Q)],
+        [(1, MINOR7_Q), (4, MINOR9_Q), (1, MINOR7_Q), (4, MINOR7_Q)],
     ]
     
     ORIENTAL_PROGRESSIONS = [
-        [(1, ChordQuality.MINOR7), (4, ChordQuality.SUS4), (1, ChordQuality.MINOR7), (7, ChordQuality.MINOR7)],
-        [(1, ChordQuality.MINOR7), (2, ChordQuality.MINOR7), (1, ChordQuality.MINOR7), (7, ChordQuality.MINOR7)],
+        [(1, MINOR7_Q), (4, SUS4_Q), (1, MINOR7_Q), (7, MINOR7_Q)],
+        [(1, MINOR7_Q), (2, MINOR7_Q), (1, MINOR7_Q), (7, MINOR7_Q)],
     ]
     
     NORDESTE_PROGRESSIONS = [
-        [(1, ChordQuality.DOMINANT7), (4, ChordQuality.MAJOR7), (1, ChordQuality.DOMINANT7), (5, ChordQuality.DOMINANT7)],
-        [(1, ChordQuality.DOMINANT7), (7, ChordQuality.MAJOR7), (6, ChordQuality.MAJOR7), (5, ChordQuality.DOMINANT7)],
+        [(1, DOMINANT7_Q), (4, MAJOR7_Q), (1, DOMINANT7_Q), (5, DOMINANT7_Q)],
+        [(1, DOMINANT7_Q), (7, MAJOR7_Q), (6, MAJOR7_Q), (5, DOMINANT7_Q)],
     ]
 
-    def __init__(self, key: str = 'A', mode: str = 'minor'):
+    # Program change de cada instrumento, criado uma vez: cada track começa por uma cópia
+    _TRACK_PREFIX = {
+        'piano': Message('program_change', program=0, channel=0),
+        'bass': Message('program_change', program=32, channel=1),
+        'pad': Message('program_change', program=89, channel=2),
+        'koto': Message('program_change', program=107, channel=7), # Koto
+        'accordion': Message('program_change', program=21, channel=8), # Accordion
+        'shakuhachi': Message('program_change', program=77, channel=9), # Shakuhachi
+        'melody': Message('program_change', program=1, channel=6),
+    }
+
+    # Instrumento -> método gerador, na ordem em que as tracks entram no arranjo
+    TRACK_METHODS = {
+        'piano': 'generate_harmony_track',
+        'bass': 'generate_bass_track',
+        'pad': 'generate_pad_track',
+        'koto': 'generate_koto_track',
+        'accordion': 'generate_accordion_track',
+        'shakuhachi': 'generate_shakuhachi_track',
+        'melody': 'generate_melody_track',
+    }
+
+    def __init__(self, key: str = 'A', mode: str = 'minor', seed: Optional[int] = None):
+        # Gerador aleatório próprio: instâncias diferentes podem rodar em threads
+        # diferentes sem disputar o estado do módulo random. Um só gerador numpy serve
+        # o BPM, a progressão e a humanização, sorteada em vetores por track
+        self._rng = np.random.default_rng(seed)
+        self.key = key
         self.key_root = self._parse_key(key)
         self.mode = mode if mode in self.SCALES else 'minor'
         self.scale = self.SCALES[self.mode]
-        self.bpm = random.randint(70, 80)
+        # Tabela grau x oitava -> nota MIDI (graus 1..14, oitavas 0..7): o tom e a escala
+        # são fixos por gerador, então as tracks só indexam em vez de recalcular
+        # (mesma conta do _get_note, feita de uma vez para a tabela toda)
+        scale, scale_len = np.array(self.scale), len(self.scale)
+        steps = np.arange(14)  # grau - 1
+        octaves = np.arange(8)[None, :] + (steps // scale_len)[:, None]
+        self._note_lut = (self.key_root + scale[steps % scale_len][:, None] + octaves * 12).astype(np.int16)
+        self.bpm = int(self._rng.integers(70, 81))
         self.swing = 0.58
 
+    def reseed(self, seed: Optional[int] = None):
+        """Reinicia o gerador aleatório, para reaproveitar a instância em outra faixa."""
+        self._rng = np.random.default_rng(seed)
+
     def _parse_key(self, key: str) -> int:
-        key_map = {'C': 0, 'C#': 1, 'Db': 1, 'D': 2, 'D#': 3, 'Eb': 3, 'E': 4, 'F': 5, 'F#': 6, 'Gb': 6, 'G': 7, 'G#': 8, 'Ab': 8, 'A': 9, 'A#': 10, 'Bb': 10, 'B': 11}
-        return key_map.get(key.upper(), 9)
+        return _KEY_MAP.get(key.upper(), 9)
 
     def _get_note(self, degree: int, octave: int) -> int:
+        # Dentro da tabela (graus 1..14, oitavas 0..7) é só uma consulta
+        if 1 <= degree <= 14 and 0 <= octave < 8:
+            return int(self._note_lut[degree - 1, octave])
         idx = (degree - 1) % len(self.scale)
         return self.key_root + self.scale[idx] + (octave + (degree - 1) // len(self.scale)) * 12
 
-    def _humanize_velocity(self, base_vel: int, variance: int = 20) -> int:
-        return max(30, min(110, base_vel + random.randint(-variance, variance)))
-
-    def _humanize_time(self, variance: int = 30) -> int:
-        return random.randint(-variance, variance)
-
-    def generate_harmony_track(self, mid: MidiFile, prog: List, measures: int) -> MidiTrack:
+    def generate_harmony_track(self, mid: MidiFile, prog: List, measures: int, rng=None) -> MidiTrack:
         """Track: Piano de Feltro (Harmonia)"""
-        track = MidiTrack()
-        track.append(Message('program_change', program=0, time=0, channel=0))
-        ticks_per_measure = mid.ticks_per_beat * 4
-        
-        events = []
-        for m in range(measures):
-            degree, quality = prog[m % len(prog)]
-            root = self._get_note(degree, 3)
-            chord = [root + i for i in quality.value]
-            start_tick = m * ticks_per_measure
-            for note in chord:
-                h_on = start_tick + self._humanize_time(40)
-                h_off = start_tick + ticks_per_measure - 60
-                events.append((max(0, h_on), 'on', note, self._humanize_velocity(45, 10)))
-                events.append((h_off, 'off', note, 0))
-
-        events.sort()
-        last_tick = 0
-        for tick, type, note, vel in events:
-            delta = tick - last_tick
-            track.append(Message('note_on' if type == 'on' else 'note_off', note=note, velocity=vel, time=delta, channel=0))
-            last_tick = tick
-        return track
-
-    def generate_bass_track(self, mid: MidiFile, prog: List, measures: int) -> MidiTrack:
+        track = MidiTrack([self._TRACK_PREFIX['piano'].copy()])
+        rng = self._rng if rng is None else rng
+        events = _build_harmony(self._note_lut, _encode_prog(prog), mid.ticks_per_beat, measures, rng)
+        return _emit_events(track, *events, channel=track[0].channel)
+
+    def generate_bass_track(self, mid: MidiFile, prog: List, measures: int, rng=None) -> MidiTrack:
         """Track: Contra-baixo (Bass)"""
-        track = MidiTrack()
-        track.append(Message('program_change', program=32, time=0, channel=1))
-        ticks_per_beat = mid.ticks_per_beat
-        ticks_per_measure = ticks_per_beat * 4
-        
-        events = []
-        for m in range(measures):
-            degree, _ = prog[m % len(prog)]
-            root = self._get_note(degree, 2)
-            for b in [0, 1.5]:
-                start_tick = int(m * ticks_per_measure + b * ticks_per_beat)
-                h_on = start_tick + self._humanize_time(20)
-                h_off = start_tick + int(ticks_per_beat * 0.8)
-                events.append((max(0, h_on), 'on', root, self._humanize_velocity(70, 10)))
-                events.append((h_off, 'off', root, 0))
-
-        events.sort()
-        last_tick = 0
-        for tick, type, note, vel in events:
-            delta = tick - last_tick
-            track.append(Message('note_on' if type == 'on' else 'note_off', note=note, velocity=vel, time=delta, channel=1))
-            last_tick = tick
-        return track
-
-    def generate_pad_track(self, mid: MidiFile, prog: List, measures: int) -> MidiTrack:
+        track = MidiTrack([self._TRACK_PREFIX['bass'].copy()])
+        rng = self._rng if rng is None else rng
+        events = _build_bass(self._note_lut, _encode_prog(prog), mid.ticks_per_beat, measures, rng)
+        return _emit_events(track, *events, channel=track[0].channel)
+
+    def generate_pad_track(self, mid: MidiFile, prog: List, measures: int, rng=None) -> MidiTrack:
         """Track: Pads Atmosféricos"""
-        track = MidiTrack()
-        track.append(Message('program_change', program=89, time=0, channel=2))
-        ticks_per_measure = mid.ticks_per_beat * 4
-        
-        events = []
-        for m in range(measures):
-            degree, quality = prog[m % len(prog)]
-            root = self._get_note(degree, 4)
-            chord = [root, root + quality.value[1], root + (quality.value[2] if len(quality.value) > 2 else 7)]
-            start_tick = m * ticks_per_measure
-            for note in chord:
-                events.append((start_tick, 'on', note, 35))
-                events.append((start_tick + ticks_per_measure, 'off', note, 0))
-
-        events.sort()
-        last_tick = 0
-        for tick, type, note, vel in events:
-            delta = tick - last_tick
-            track.append(Message('note_on' if type == 'on' else 'note_off', note=note, velocity=vel, time=delta, channel=2))
-            last_tick = tick
-        return track
-
-    def generate_koto_track(self, mid: MidiFile, prog: List, measures: int) -> MidiTrack:
+        track = MidiTrack([self._TRACK_PREFIX['pad'].copy()])
+        rng = self._rng if rng is None else rng
+        events = _build_pad(self._note_lut, _encode_prog(prog), mid.ticks_per_beat, measures, rng)
+        return _emit_events(track, *events, channel=track[0].channel)
+
+    def generate_koto_track(self, mid: MidiFile, prog: List, measures: int, rng=None) -> MidiTrack:
         """Track: Koto (Cítara Japonesa) - Melodia Oriental"""
-        track = MidiTrack()
-        track.append(Message('program_change', program=107, time=0, channel=7)) # Koto
-        ticks_per_beat = mid.ticks_per_beat
-        ticks_per_measure = ticks_per_beat * 4
-        
-        events = []
-        for m in range(measures):
-            degree, _ = prog[m % len(prog)]
-            # Usa apenas notas da escala pentatônica para autenticidade
-            for b in [0, 0.5, 2, 2.5]:
-                if random.random() < 0.7:
-                    note = self._get_note(degree + random.randint(0, 4), 5)
-                    start_tick = int(m * ticks_per_measure + b * ticks_per_beat)
-                    events.append((start_tick, 'on', note, 60))
-                    events.append((start_tick + 120, 'off', note, 0))
-
-        events.sort()
-        last_tick = 0
-        for tick, type, note, vel in events:
-            delta = tick - last_tick
-            track.append(Message('note_on' if type == 'on' else 'note_off', note=note, velocity=vel, time=delta, channel=7))
-            last_tick = tick
-        return track
-
-    def generate_accordion_track(self, mid: MidiFile, prog: List, measures: int) -> MidiTrack:
+        track = MidiTrack([self._TRACK_PREFIX['koto'].copy()])
+        rng = self._rng if rng is None else rng
+        events = _build_koto(self._note_lut, _encode_prog(prog), mid.ticks_per_beat, measures, rng)
+        return _emit_events(track, *events, channel=track[0].channel)
+
+    def generate_accordion_track(self, mid: MidiFile, prog: List, measures: int, rng=None) -> MidiTrack:
         """Track: Sanfona (Accordion) - Melodia Nordestina"""
-        track = MidiTrack()
-        track.append(Message('program_change', program=21, time=0, channel=8)) # Accordion
-        ticks_per_beat = mid.ticks_per_beat
-        ticks_per_measure = ticks_per_beat * 4
-        
-        events = []
-        for m in range(measures):
-            degree, _ = prog[m % len(prog)]
-            # Melodia com "puxadas" de fole características (notas duplas/terças)
-            for b in [0.5, 1, 2.5, 3]:
-                if random.random() < 0.6:
-                    root = self._get_note(degree, 5)
-                    notes = [root, root + 4] # Terças
-                    start_tick = int(m * ticks_per_measure + b * ticks_per_beat)
-                    for note in notes:
-                        events.append((start_tick, 'on', note, 55))
-                        events.append((start_tick + int(ticks_per_beat * 0.4), 'off', note, 0))
-
-        events.sort()
-        last_tick = 0
-        for tick, type, note, vel in events:
-            delta = tick - last_tick
-            track.append(Message('note_on' if type == 'on' else 'note_off', note=note, velocity=vel, time=delta, channel=8))
-            last_tick = tick
-        return track
-
-    def generate_shakuhachi_track(self, mid: MidiFile, prog: List, measures: int) -> MidiTrack:
+        track = MidiTrack([self._TRACK_PREFIX['accordion'].copy()])
+        rng = self._rng if rng is None else rng
+        events = _build_accordion(self._note_lut, _encode_prog(prog), mid.ticks_per_beat, measures, rng)
+        return _emit_events(track, *events, channel=track[0].channel)
+
+    def generate_shakuhachi_track(self, mid: MidiFile, prog: List, measures: int, rng=None) -> MidiTrack:
         """Track: Shakuhachi (Flauta de Bambu) - Melodia Oriental Etérea"""
-        track = MidiTrack()
-        track.append(Message('program_change', program=77, time=0, channel=9)) # Shakuhachi
-        ticks_per_measure = mid.ticks_per_beat * 4
-        
-        events = []
-        for m in range(0, measures, 2):
-            if random.random() < 0.5:
-                degree, _ = prog[m % len(prog)]
-                note = self._get_note(degree, 6)
-                start_tick = m * ticks_per_measure + mid.ticks_per_beat * 2
-                events.append((start_tick, 'on', note, 45))
-                events.append((start_tick + ticks_per_measure // 2, 'off', note, 0))
-
-        events.sort()
-        last_tick = 0
-        for tick, type, note, vel in events:
-            delta = tick - last_tick
-            track.append(Message('note_on' if type == 'on' else 'note_off', note=note, velocity=vel, time=delta, channel=9))
-            last_tick = tick
-        return track
-
-    def generate_full_ensemble(self, mid: MidiFile, prog: List, measures: int, instruments: List[str] = None):
-        """Gera um arranjo completo com base na lista de instrumentos."""
+        track = MidiTrack([self._TRACK_PREFIX['shakuhachi'].copy()])
+        rng = self._rng if rng is None else rng
+        events = _build_shakuhachi(self._note_lut, _encode_prog(prog), mid.ticks_per_beat, measures, rng)
+        return _emit_events(track, *events, channel=track[0].channel)
+
+    def generate_melody_track(self, mid: MidiFile, prog: List, measures: int, rng=None) -> MidiTrack:
+        """Track: Melodia de Piano sobre as notas dos acordes"""
+        track = MidiTrack([self._TRACK_PREFIX['melody'].copy()])
+        rng = self._rng if rng is None else rng
+        events = _build_melody(self._note_lut, _encode_prog(prog), mid.ticks_per_beat, measures, rng)
+        return _emit_events(track, *events, channel=track[0].channel)
+
+    def _ensemble_events(self, prog: List, measures: int, instruments, ticks_per_beat: int, executor=None,
+                         workers: Optional[int] = None):
+        """
+        Calcula os eventos de cada instrumento selecionado no executor (por padrão um pool de
+        threads próprio com até workers threads, uma por instrumento se None; um
+        ProcessPoolExecutor também serve). workers=1 calcula em série, sem pool: útil quando
+        quem chama já roda em vários processos. Devolve [(nome, eventos)] na ordem do TRACK_METHODS.
+        """
         if instruments is None:
             instruments = ['piano', 'bass', 'pad', 'melody']
             
-        if 'piano' in instruments:
-            mid.tracks.append(self.generate_harmony_track(mid, prog, measures))
-        if 'bass' in instruments:
-            mid.tracks.append(self.generate_bass_track(mid, prog, measures))
-        if 'pad' in instruments:
-            mid.tracks.append(self.generate_pad_track(mid, prog, measures))
-        if 'koto' in instruments:
-            mid.tracks.append(self.generate_koto_track(mid, prog, measures))
-        if 'accordion' in instruments:
-            mid.tracks.append(self.generate_accordion_track(mid, prog, measures))
-        if 'shakuhachi' in instruments:
-            mid.tracks.append(self.generate_shakuhachi_track(mid, prog, measures))
-        if 'melody' in instruments:
-            # Reutiliza a melodia de piano se solicitado
-            track = MidiTrack()
-            track.append(Message('program_change', program=1, time=0, channel=6))
-            ticks_per_beat = mid.ticks_per_beat
-            ticks_per_measure = ticks_per_beat * 4
-            events = []
-            for m in range(measures):
-                degree, quality = prog[m % len(prog)]
-                chord_notes = [self._get_note(degree, 4) + i for i in quality.value]
-                for b in [0.5, 2, 3.5]:
-                    if random.random() < 0.6:
-                        note = random.choice(chord_notes) + 12
-                        start_tick = int(m * ticks_per_measure + b * ticks_per_beat)
-                        events.append((max(0, start_tick), 'on', note, 75))
-                        events.append((start_tick + int(ticks_per_beat * 1.2), 'off', note, 0))
-            events.sort()
-            last_tick = 0
-            for tick, type, note, vel in events:
-                delta = tick - last_tick
-                track.append(Message('note_on' if type == 'on' else 'note_off', note=note, velocity=vel, time=delta, channel=6))
-                last_tick = tick
-            mid.tracks.append(track)
-
-    def generate(self, output_path: str, measures: int = 16, instruments: List[str] = None):
+        names = [name for name in self.TRACK_METHODS if name in instruments]
+        # Cada track ganha seu próprio gerador, semeado em série a partir do da instância:
+        # os workers não disputam o mesmo estado e o resultado não depende de quem termina antes
+        seeds = self._rng.integers(0, 2**32, size=len(names))
+        prog_arrays = _encode_prog(prog)
+        if executor is None and workers == 1:
+            return [(name, TRACK_BUILDERS[name](self._note_lut, prog_arrays, ticks_per_beat, measures,
+                                                np.random.default_rng(seed)))
+                    for name, seed in zip(names, seeds)]
+        pool = executor if executor is not None else ThreadPoolExecutor(max_workers=workers or max(1, len(names)))
+        try:
+            futures = [pool.submit(TRACK_BUILDERS[name], self._note_lut, prog_arrays, ticks_per_beat,
+                                   measures, np.random.default_rng(seed))
+                       for name, seed in zip(names, seeds)]
+            # Resultados coletados na ordem do TRACK_METHODS, não na de conclusão
+            return [(name, future.result()) for name, future in zip(names, futures)]
+        finally:
+            if executor is None:
+                pool.shutdown()
+
+    def generate_full_ensemble(self, mid: MidiFile, prog: List, measures: int, instruments: List[str] = None,
+                               executor=None):
+        """Gera um arranjo completo com base na lista de instrumentos (ver _ensemble_events)."""
+        for name, events in self._ensemble_events(prog, measures, instruments, mid.ticks_per_beat, executor):
+            track = MidiTrack([self._TRACK_PREFIX[name].copy()])
+            mid.tracks.append(_emit_events(track, *events, channel=track[0].channel))
+
+    def _generate_bytes(self, measures: int, instruments: Optional[Tuple[str, ...]],
+                        workers: Optional[int] = None, executor=None) -> bytes:
         mid = MidiFile(ticks_per_beat=480)
         
         # Escolha de progressão baseada no modo
         if self.mode == 'pentatonic_minor':
-            prog = random.choice(self.ORIENTAL_PROGRESSIONS)
+            prog = self.ORIENTAL_PROGRESSIONS[self._rng.integers(len(self.ORIENTAL_PROGRESSIONS))]
         elif self.mode == 'lydian_b7':
-            prog = random.choice(self.NORDESTE_PROGRESSIONS)
+            prog = self.NORDESTE_PROGRESSIONS[self._rng.integers(len(self.NORDESTE_PROGRESSIONS))]
         else:
-            prog = random.choice(self.MELANCHOLIC_PROGRESSIONS)
+            prog = self.MELANCHOLIC_PROGRESSIONS[self._rng.integers(len(self.MELANCHOLIC_PROGRESSIONS))]
             
         meta = MidiTrack()
         mid.tracks.append(meta)
         meta.append(MetaMessage('set_tempo', tempo=mido.bpm2tempo(self.bpm)))
         meta.append(MetaMessage('track_name', name='LoFi Master Clock'))
 
-        self.generate_full_ensemble(mid, prog, measures, instruments)
-        mid.save(output_path)
+        # As tracks dos instrumentos vão direto dos arrays de eventos para bytes SMF, sem
+        # Message nem MidiTrack; o arquivo é montado num buffer só, sem o encoder do mido.save
+        bodies = [_encode_events(self._TRACK_PREFIX[name], *events)
+                  for name, events in self._ensemble_events(prog, measures, instruments, mid.ticks_per_beat,
+                                                           executor, workers)]
+        return bytes(encode_file(mid, bodies))
+
+    def generate(self, output_path: str, measures: int = 16, instruments: List[str] = None,
+                 workers: Optional[int] = None):
+        """
+        Gera o arquivo MIDI do arranjo. As tracks dos instrumentos são calculadas em paralelo
+        num pool de threads (workers: tamanho do pool; 1 = em série).
+        """
+        # O arquivo só depende do tom, modo, BPM, parâmetros e do estado do gerador aleatório:
+        # repetições (ex.: a mesma seed num lote) saem do cache e o gerador avança igual
+        data, rng_state = _cached_file(
+            self.key, self.mode, self.bpm, measures,
+            None if instruments is None else tuple(instruments),
+            _freeze_state(self._rng.bit_generator.state), _Unkeyed(workers))
+        self._rng.bit_generator.state = rng_state
+        with open(output_path, 'wb') as f:
+            f.write(data)
         return output_path
+
+    @classmethod
+    def batch_generate(cls, specs: List[Dict], out_dir: str, workers: Optional[int] = None) -> List[str]:
+        """
+        Gera várias músicas num só processo. Cada spec é um dict com 'key', 'mode', 'seed',
+        'measures', 'instruments' e 'filename' (todos opcionais) e produz o mesmo arquivo que
+        LofiMidiGenerator(key, mode, seed).generate(...). Um gerador por (tom, modo) é
+        reaproveitado (tabela de notas pronta, só reseed por música) e um único pool de
+        threads atende as tracks de todas as músicas.
+        """
+        os.makedirs(out_dir, exist_ok=True)
+        generators = {}
+        paths = []
+        with ThreadPoolExecutor(max_workers=workers or len(cls.TRACK_METHODS)) as pool:
+            for i, spec in enumerate(specs):
+                key, mode = spec.get('key', 'A'), spec.get('mode', 'minor')
+                generator = generators.get((key, mode))
+                if generator is None:
+                    generator = generators[(key, mode)] = cls(key, mode)
+                # Mesma sequência de sorteios de uma instância nova com essa seed
+                generator.reseed(spec.get('seed'))
+                generator.bpm = int(generator._rng.integers(70, 81))
+                instruments = spec.get('instruments')
+                data = generator._generate_bytes(spec.get('measures', 16),
+                                                 None if instruments is None else tuple(instruments),
+                                                 executor=pool)
+                path = os.path.join(out_dir, spec.get('filename', f"lofi_{i:03d}_{key}_{generator.mode}.mid"))
+                with open(path, 'wb') as f:
+                    f.write(data)
+                paths.append(path)
+        return paths
+
+
+# As progressões da classe viram arrays (_encode_prog) já no import: nenhuma track paga
+# a conversão na primeira chamada
+for _progressions in (LofiMidiGenerator.MELANCHOLIC_PROGRESSIONS, LofiMidiGenerator.ORIENTAL_PROGRESSIONS,
+                      LofiMidiGenerator.NORDESTE_PROGRESSIONS):
+    for _prog in _progressions:
+        _encode_prog(_prog)
+
+
+def _freeze_state(state):
+    """Estado do bit generator (dict aninhado) como tupla, para servir de chave de cache."""
+    return tuple((k, _freeze_state(v) if isinstance(v, dict) else v) for k, v in sorted(state.items()))
+
+
+def _thaw_state(frozen):
+    return {k: _thaw_state(v) if isinstance(v, tuple) else v for k, v in frozen}
+
+
+class _Unkeyed:
+    """
+    Argumento repassado à função em cache sem entrar na chave: todas as instâncias têm o
+    mesmo hash e são iguais entre si (ex.: o tamanho do pool, que não muda o resultado).
+    """
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __hash__(self):
+        return 0
+
+    def __eq__(self, other):
+        return isinstance(other, _Unkeyed)
+
+
+@lru_cache(maxsize=64)
+def _cached_file(key, mode, bpm, measures, instruments, rng_state, workers=_Unkeyed(None)):
+    """
+    Gera os bytes do arquivo a partir do estado dado; devolve também o estado final.
+    workers (embrulhado em _Unkeyed) só dimensiona o pool e fica fora da chave do cache.
+    """
+    generator = LofiMidiGenerator(key, mode)
+    generator.bpm = bpm
+    generator._rng.bit_generator.state = _thaw_state(rng_state)
+    return generator._generate_bytes(measures, instruments, workers.value), generator._rng.bit_generator.state
@@ -0,0 +1,173 @@
+"""
+Escritor MIDI Direto
+Serializa um MidiFile em bytes SMF (MThd + MTrk) sem passar pelo encoder do mido.save.
+"""
+
+import struct
+import numpy as np
+from mido import Message
+
+# Status de canal das mensagens que os geradores emitem (o canal entra nos 4 bits baixos)
+_CHANNEL_STATUS = {'note_off': 0x80, 'note_on': 0x90, 'control_change': 0xB0, 'program_change': 0xC0}
+
+_END_OF_TRACK = b'\xff\x2f\x00'
+
+
+def encode_vlq(value: int) -> bytes:
+    """Codifica um inteiro não negativo como quantidade de tamanho variável (delta-time MIDI)."""
+    out = [value & 0x7F]
+    value >>= 7
+    while value:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    return bytes(reversed(out))
+
+
+# Deltas de até 16383 ticks (mais de 8 compassos a 480 ppq) saem direto da tabela
+_VLQ = tuple(encode_vlq(v) for v in range(0x4000))
+
+
+def _vlq(value: int) -> bytes:
+    return _VLQ[value] if value < 0x4000 else encode_vlq(value)
+
+
+def encode_track(track) -> bytearray:
+    """
+    Gera o corpo de um MTrk (sem o cabeçalho) a partir das mensagens da track,
+    com running status e o end_of_track no final, como o mido.save faria.
+    """
+    data = bytearray()
+    running_status = None
+    carry = 0  # Delta de end_of_track intermediários, repassado à próxima mensagem
+    for msg in track:
+        msg_type = msg.type
+        if msg_type == 'end_of_track':
+            carry += msg.time
+            continue
+        data += _vlq(msg.time + carry)
+        carry = 0
+        status = _CHANNEL_STATUS.get(msg_type)
+        if status is not None:
+            status |= msg.channel
+            if status != running_status:
+                data.append(status)
+                running_status = status
+            if msg_type == 'program_change':
+                data.append(msg.program)
+            elif msg_type == 'control_change':
+                data += bytes((msg.control, msg.value))
+            else:
+                data += bytes((msg.note, msg.velocity))
+        elif msg.is_meta:
+            data += bytes(msg.bytes())
+            running_status = None
+        elif msg_type == 'sysex':
+            # No SMF o sysex leva o tamanho (dados + F7) em VLQ logo após o F0
+            data.append(0xF0)
+            data += _vlq(len(msg.data) + 1)
+            data += bytes(msg.data)
+            data.append(0xF7)
+            running_status = None
+        else:
+            msg_bytes = msg.bytes()
+            if msg_bytes[0] == running_status:
+                data += bytes(msg_bytes[1:])
+            else:
+                data += bytes(msg_bytes)
+            running_status = msg_bytes[0] if msg_bytes[0] < 0xF0 else None
+    data += _vlq(carry)
+    data += _END_OF_TRACK
+    return data
+
+
+def note_messages(deltas, kinds, notes, vels, channel) -> list:
+    """
+    Converte arrays paralelos de eventos já ordenados (delta, kind 0/1 = note_off/note_on,
+    nota, velocity) em Messages, numa única list comprehension. Os geradores só produzem
+    notas e velocities dentro da faixa MIDI e deltas não negativos, então a validação do
+    mido por mensagem é pulada.
+    """
+    # Classe e tipos em variáveis locais: nenhuma busca global por evento
+    message, types = Message, ('note_off', 'note_on')
+    return [message(types[kind], skip_checks=True, note=note, velocity=vel, time=delta, channel=channel)
+            for kind, note, vel, delta in zip(np.asarray(kinds).tolist(), np.asarray(notes).tolist(),
+                                              np.asarray(vels).tolist(), np.asarray(deltas).tolist())]
+
+
+def encode_note_arrays(deltas, status, data1, data2) -> bytes:
+    """
+    Gera o corpo de um MTrk direto de arrays paralelos de mensagens de canal com 2 bytes
+    de dados (note_on/note_off), sem criar um Message por evento. Tudo é vetorizado:
+    tamanho de cada evento, running status e os grupos de 7 bits do VLQ dos deltas.
+    """
+    deltas = np.asarray(deltas, dtype=np.int64)
+    status = np.asarray(status, dtype=np.uint8)
+    n = len(deltas)
+    # Bytes do VLQ de cada delta (até 4: deltas < 2**28)
+    vlq_len = 1 + (deltas >= 0x80) + (deltas >= 0x4000) + (deltas >= 0x200000)
+    # Running status: o byte de status só é escrito quando muda
+    new_status = np.ones(n, dtype=bool)
+    new_status[1:] = status[1:] != status[:-1]
+    ev_len = vlq_len + new_status + 2
+    starts = np.cumsum(ev_len) - ev_len
+
+    out = np.empty(int(ev_len.sum()) + 1 + len(_END_OF_TRACK), dtype=np.uint8)
+    for k in range(4):
+        # k-ésimo grupo de 7 bits, contando do menos significativo (que fica por último)
+        has = vlq_len > k
+        group = (deltas[has] >> (7 * k)) & 0x7F
+        out[starts[has] + vlq_len[has] - 1 - k] = group | 0x80 if k else group
+    pos = starts + vlq_len
+    out[pos[new_status]] = status[new_status]
+    pos += new_status
+    out[pos] = data1
+    out[pos + 1] = data2
+    out[-1 - len(_END_OF_TRACK):] = np.frombuffer(b'\x00' + _END_OF_TRACK, dtype=np.uint8)
+    return out.tobytes()
+
+
+def encode_file(mid, raw_tracks=()) -> bytearray:
+    """
+    Monta o arquivo SMF inteiro (MThd + MTrk) num único buffer pré-dimensionado.
+    raw_tracks são corpos de MTrk já codificados (ex.: encode_note_arrays), gravados
+    depois das tracks do MidiFile.
+    """
+    bodies = [encode_track(track) for track in mid.tracks] + list(raw_tracks)
+    buf = bytearray(14 + sum(8 + len(body) for body in bodies))
+    struct.pack_into('>4sIhhh', buf, 0, b'MThd', 6, mid.type, len(bodies), mid.ticks_per_beat)
+    pos = 14
+    for body in bodies:
+        struct.pack_into('>4sI', buf, pos, b'MTrk', len(body))
+        pos += 8
+        buf[pos:pos + len(body)] = body
+        pos += len(body)
+    return buf
+
+
+def fast_save(mid, path, raw_tracks=()) -> None:
+    """Salva o MidiFile (ver encode_file) com uma única escrita em disco."""
+    with open(path, 'wb') as f:
+        f.write(encode_file(mid, raw_tracks))
+
+
+if __name__ == "__main__":
+    # Conferência: os mesmos bytes que o mido.save, inclusive sysex, pitchwheel e running status
+    import io
+    from mido import MetaMessage, MidiFile, MidiTrack
+
+    mid = MidiFile(ticks_per_beat=480)
+    mid.tracks.append(MidiTrack([
+        MetaMessage('set_tempo', tempo=500000),
+        Message('sysex', data=[1, 2, 3]),
+        Message('note_on', note=60, velocity=80, time=10),
+        Message('note_on', note=64, velocity=80),
+        Message('pitchwheel', pitch=1000, time=20000),
+        Message('pitchwheel', pitch=-8192),
+        Message('control_change', control=64, value=127),
+        Message('program_change', program=5, time=5),
+        Message('note_off', note=60, velocity=0, time=480),
+    ]))
+    expected = io.BytesIO()
+    mid.save(file=expected)
+    assert bytes(encode_file(mid)) == expected.getvalue(), "encode_file diverge do mido.save"
+    print("✓ encode_file gera os mesmos bytes que o mido.save")
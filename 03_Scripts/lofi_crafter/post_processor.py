@@ -3,16 +3,127 @@ Pós-Processador de Áudio Lo-Fi - Versão Mixagem Limpa
 Aplica EQ corretivo (High-Pass/Low-Pass) e Gain Staging para texturas "fantasma".
 """
 
+import json
+import logging
+import mmap
 import os
+import struct
 import random
+import tempfile
+from functools import lru_cache
+import numpy as np
+from scipy.signal import butter, sosfilt
 from pydub import AudioSegment
 from pydub.effects import normalize
+from pydub.utils import get_min_max_value
+
+logger = logging.getLogger(__name__)
+
+
+@lru_cache(maxsize=32)
+def _butter_sos(order, cutoff, frame_rate, btype):
+    """Coeficientes SOS do Butterworth, calculados uma vez por (ordem, corte, taxa, tipo)."""
+    return butter(order, cutoff / (0.5 * frame_rate), btype=btype, output='sos')
+
+
+def _filter_block(samples, frame_rate, high_pass=None, low_pass=None, order=4):
+    """
+    Filtros Butterworth (ordem 4, 24 dB/oitava) em seções de segunda ordem, aplicados ao
+    bloco inteiro (frames, canais) pelo sosfilt em C, e não amostra a amostra em Python.
+    O corte é bem mais íngreme que o filtro de 1 polo do pydub.
+    """
+    x = samples.astype(np.float64)
+    if high_pass:
+        x = sosfilt(_butter_sos(order, high_pass, frame_rate, 'highpass'), x, axis=0)
+    if low_pass:
+        x = sosfilt(_butter_sos(order, low_pass, frame_rate, 'lowpass'), x, axis=0)
+    return x
+
+
+def _filter_segment(seg, high_pass=None, low_pass=None):
+    """Aplica _filter_block a um AudioSegment e devolve um novo segmento do mesmo formato."""
+    samples = np.array(seg.get_array_of_samples()).reshape(-1, seg.channels)
+    filtered = _filter_block(samples, seg.frame_rate, high_pass, low_pass)
+    minval, maxval = get_min_max_value(seg.sample_width * 8)
+    out = np.clip(filtered, minval, maxval).astype(samples.dtype)
+    return seg._spawn(data=out.tobytes())
+
+
+def _write_atomic(path, write):
+    """Grava via write(f) num temporário da mesma pasta e o troca pelo destino com os.replace."""
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            write(f)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def _decoded_texture(layer_file, high_pass=300):
+    """
+    Textura decodificada e já com o EQ corretivo, com cache em disco ao lado do MP3
+    (.npy com o PCM + .json com formato e mtime do original): num acerto não roda o
+    ffmpeg, o decoder de MP3 nem o filtro. O cache é refeito se o MP3 mudar.
+    """
+    cache_npy = f"{layer_file}.hp{high_pass}.npy"
+    cache_meta = f"{layer_file}.hp{high_pass}.json"
+    mtime = os.path.getmtime(layer_file)
+    try:
+        with open(cache_meta) as f:
+            meta = json.load(f)
+        if meta['mtime'] == mtime:
+            samples = np.load(cache_npy)
+            return AudioSegment(data=samples.tobytes(), sample_width=meta['sample_width'],
+                                frame_rate=meta['frame_rate'], channels=meta['channels'])
+    except (OSError, ValueError, KeyError):
+        pass
+
+    texture = AudioSegment.from_mp3(layer_file)
+    # EQ Corretivo na Textura: Corta graves (300Hz) para não sujar o Bass/Kick
+    texture = _filter_segment(texture, high_pass=high_pass)
+    samples = np.array(texture.get_array_of_samples()).reshape(-1, texture.channels)
+    meta = json.dumps({'mtime': mtime, 'frame_rate': texture.frame_rate,
+                       'channels': texture.channels, 'sample_width': texture.sample_width})
+    try:
+        # Workers em paralelo podem errar o cache juntos: cada um grava em temporário e
+        # troca por os.replace (atômico), o .json por último, para nenhum leitor ver um
+        # arquivo pela metade ou um .json apontando para um .npy ainda não gravado
+        _write_atomic(cache_npy, lambda f: np.save(f, samples))
+        _write_atomic(cache_meta, lambda f: f.write(meta.encode()))
+    except OSError:
+        pass  # Pasta de samples sem permissão de escrita: segue sem cache em disco
+    return texture
 
 class PostProcessor:
-    def __init__(self, rain_dir=None, vinyl_dir=None):
+    def __init__(self, rain_dir=None, vinyl_dir=None, seed=None):
         base_dir = "/home/ubuntu/youtube_automation/03_Scripts/lofi_crafter/client/assets/samples/loops"
         self.rain_dir = rain_dir if rain_dir else os.path.join(base_dir, "rain")
         self.vinyl_dir = vinyl_dir if vinyl_dir else os.path.join(base_dir, "vinyl")
+        # MP3s de cada pasta listados uma vez: num lote o sorteio não relê o diretório
+        self._files = {
+            layer_type: sorted(f for f in os.listdir(folder) if f.endswith(".mp3"))
+            if os.path.isdir(folder) else []
+            for layer_type, folder in (("rain", self.rain_dir), ("vinyl", self.vinyl_dir))
+        }
+        # Texturas já decodificadas, filtradas e atenuadas, por (arquivo, volume):
+        # num lote o mesmo MP3 é sorteado várias vezes e não precisa ser refeito
+        self._textures = {}
+        # Sorteio das texturas com gerador próprio (reprodutível com seed), fora do
+        # estado global do módulo random
+        self._rng = random.Random(seed)
+
+    def _load_texture(self, layer_file, volume_reduction):
+        cache_key = (layer_file, volume_reduction)
+        texture = self._textures.get(cache_key)
+        if texture is None:
+            texture = _decoded_texture(layer_file)
+            
+            # Ganho sutil (Ghost Texture)
+            texture = texture + volume_reduction
+            self._textures[cache_key] = texture
+        return texture
 
     def apply_eq_filters(self, audio, low_pass=5000, high_pass=150):
         """
@@ -20,10 +131,8 @@ class PostProcessor:
         - Low-pass: Corta agudos extremos (vibe nostálgica).
         - High-pass: Limpa o 'lodo' dos graves.
         """
-        print(f"Aplicando EQ: High-pass {high_pass}Hz | Low-pass {low_pass}Hz...")
-        audio = audio.high_pass_filter(high_pass)
-        audio = audio.low_pass_filter(low_pass)
-        return audio
+        logger.info(f"Aplicando EQ: High-pass {high_pass}Hz | Low-pass {low_pass}Hz...")
+        return _filter_segment(audio, high_pass=high_pass, low_pass=low_pass)
 
     def add_texture_layer(self, audio, layer_type="rain", volume_reduction=-22):
         """
@@ -31,34 +140,29 @@ class PostProcessor:
         Corta tudo abaixo de 300Hz nas texturas para evitar colisão de graves.
         """
         target_dir = self.rain_dir if layer_type == "rain" else self.vinyl_dir
-        if not os.path.exists(target_dir):
-            return audio
-
-        files = [f for f in os.listdir(target_dir) if f.endswith(".mp3")]
+        files = self._files["rain" if layer_type == "rain" else "vinyl"]
         if not files:
             return audio
             
-        layer_file = os.path.join(target_dir, random.choice(files))
-        print(f"Adicionando textura {layer_type} (Volume: {volume_reduction}dB)...")
-        
-        texture = AudioSegment.from_mp3(layer_file)
-        
-        # EQ Corretivo na Textura: Corta graves (300Hz) para não sujar o Bass/Kick
-        texture = texture.high_pass_filter(300)
-        
-        # Ganho sutil (Ghost Texture)
-        texture = texture + volume_reduction
+        layer_file = os.path.join(target_dir, self._rng.choice(files))
+        logger.info(f"Adicionando textura {layer_type} (Volume: {volume_reduction}dB)...")
         
-        # Loop para cobrir o áudio
-        loops = (len(audio) // len(texture)) + 1
-        texture_loop = (texture * loops)[:len(audio)]
+        texture = self._load_texture(layer_file, volume_reduction)
+        # Mesmo formato do mix (no-op quando já bate), como o overlay do pydub faria
+        texture = (texture.set_frame_rate(audio.frame_rate)
+                          .set_channels(audio.channels)
+                          .set_sample_width(audio.sample_width))
         
-        return audio.overlay(texture_loop)
+        # Loop para cobrir o áudio e soma com saturação num único passo em NumPy,
+        # sem concatenar AudioSegments (texture * loops) nem o overlay do pydub
+        main = np.array(audio.get_array_of_samples()).reshape(-1, audio.channels)
+        tex = np.array(texture.get_array_of_samples()).reshape(-1, audio.channels)
+        idx = np.arange(len(main)) % len(tex)
+        minval, maxval = get_min_max_value(audio.sample_width * 8)
+        mixed = np.clip(main.astype(np.int64) + tex[idx], minval, maxval).astype(main.dtype)
+        return audio._spawn(data=mixed.tobytes())
 
-    def process(self, input_wav, output_wav):
-        print(f"Iniciando Mixagem Lo-Fi: {input_wav}")
-        audio = AudioSegment.from_wav(input_wav)
-        
+    def _mix(self, audio, output_wav):
         # 1. EQ Corretivo no Mix Principal (Limpa o lodo abaixo de 100Hz e agudos acima de 5k)
         audio = self.apply_eq_filters(audio, low_pass=5000, high_pass=100)
         
@@ -68,6 +172,44 @@ class PostProcessor:
         
         # 3. Normalização e Export
         audio = normalize(audio)
-        audio.export(output_wav, format="wav")
-        print(f"✓ Mixagem finalizada: {output_wav}")
+        if audio.sample_width == 2:
+            samples = np.frombuffer(audio.raw_data, dtype=np.int16).reshape(-1, audio.channels)
+            self.write_mapped(output_wav, samples, audio.frame_rate)
+        else:
+            audio.export(output_wav, format="wav")
+        logger.info(f"✓ Mixagem finalizada: {output_wav}")
         return output_wav
+
+    def write_mapped(self, path, buf, samplerate):
+        """
+        Grava um WAV PCM (array (frames, canais)) por mmap: o arquivo é criado já no tamanho
+        final e cabeçalho e amostras são copiados direto no mapeamento, sem buffer de escrita.
+        """
+        buf = np.ascontiguousarray(buf)
+        channels = buf.shape[1] if buf.ndim > 1 else 1
+        width = buf.dtype.itemsize
+        size = 44 + buf.nbytes
+        with open(path, 'w+b') as f:
+            os.ftruncate(f.fileno(), size)
+            with mmap.mmap(f.fileno(), size) as mm:
+                struct.pack_into('<4sI4s4sIHHIIHH4sI', mm, 0,
+                                 b'RIFF', size - 8, b'WAVE',
+                                 b'fmt ', 16, 1, channels, samplerate,
+                                 samplerate * channels * width, channels * width, width * 8,
+                                 b'data', buf.nbytes)
+                mm[44:] = memoryview(buf).cast('B')
+        return path
+
+    def process(self, input_wav, output_wav):
+        logger.info(f"Iniciando Mixagem Lo-Fi: {input_wav}")
+        return self._mix(AudioSegment.from_wav(input_wav), output_wav)
+
+    def process_array(self, samples, output_wav, sample_rate=44100):
+        """
+        Mesma mixagem do process, partindo de PCM 16 bits já em memória
+        (array (frames, canais) int16, como o AudioRenderer.render_to_array devolve).
+        """
+        logger.info(f"Iniciando Mixagem Lo-Fi: {output_wav} (áudio em memória)")
+        audio = AudioSegment(data=samples.tobytes(), sample_width=2,
+                             frame_rate=sample_rate, channels=samples.shape[1])
+        return self._mix(audio, output_wav)
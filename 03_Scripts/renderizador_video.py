@@ -2,31 +2,59 @@ import threading
 import customtkinter as ctk
 from tkinter import filedialog, messagebox
 from pathlib import Path
+import os
 import subprocess
+import tempfile
 import time
+from functools import lru_cache
 import numpy as np
-import cv2 
-from proglog import ProgressBarLogger
 
 # --- IMPORTS MOVIEPY 2.2.1 ---
-from moviepy import (
-    VideoFileClip, ImageClip, AudioFileClip, TextClip, ColorClip, 
-    CompositeVideoClip, concatenate_videoclips, vfx
-)
+from moviepy import TextClip
 
-# ✅ Blur via OpenCV
-def aplicar_blur_opencv(frame):
-    return cv2.GaussianBlur(frame, (61, 61), 10)
+# ✅ Encoders H.264 em ordem de preferência: (preset, parâmetros extras do ffmpeg)
+# GPU (NVIDIA / Intel QSV / Apple) primeiro; libx264 na CPU fica como fallback
+ENCODERS = {
+    "h264_nvenc": ("p5", ["-tune", "hq", "-rc", "vbr", "-cq", "23", "-b:v", "0"]),
+    "h264_qsv": ("faster", ["-global_quality", "23"]),
+    "h264_videotoolbox": (None, ["-b:v", "6M"]),
+    "libx264": ("ultrafast", []),
+}
 
-class MugiwaraLogger(ProgressBarLogger):
-    def __init__(self, app):
-        super().__init__()
-        self.app = app
+@lru_cache(maxsize=None)
+def escolher_encoder():
+    """
+    Testa uma vez por execução qual encoder funciona nesta máquina: estar listado no
+    `ffmpeg -encoders` não garante GPU/driver, então cada um codifica 1 frame de teste.
+    """
+    for codec in ENCODERS:
+        if codec == "libx264":
+            break
+        teste = ['ffmpeg', '-hide_banner', '-loglevel', 'error', '-f', 'lavfi',
+                 '-i', 'color=size=256x256:duration=0.1', '-frames:v', '1',
+                 '-c:v', codec, '-f', 'null', '-']
+        try:
+            if subprocess.run(teste, capture_output=True, timeout=15).returncode == 0:
+                return codec
+        except FileNotFoundError:
+            break  # Sem ffmpeg no PATH: nenhum encoder vai funcionar
+        except (OSError, subprocess.SubprocessError):
+            continue  # Ex.: driver travado (timeout) neste encoder; tenta o próximo
+    return "libx264"
+
+def probe_midia(path):
+    """Duração (s), largura e altura do primeiro stream de vídeo (0 x 0 se for só áudio) via ffprobe."""
+    # Cache por (caminho, mtime): renders seguidos com o mesmo fundo/beat não rodam o ffprobe de novo
+    return _probe_midia(str(path), os.path.getmtime(path))
 
-    def bars_callback(self, bar, attr, value, old_value=None):
-        total = self.bars[bar]['total']
-        percentage = value / total
-        self.app.after(0, lambda: self.app.atualizar_barra(percentage, bar))
+@lru_cache(maxsize=32)
+def _probe_midia(path, mtime):
+    saida = subprocess.run(
+        ['ffprobe', '-v', 'error', '-show_entries', 'format=duration:stream=width,height',
+         '-select_streams', 'v:0', '-of', 'default=noprint_wrappers=1', str(path)],
+        capture_output=True, text=True, check=True).stdout
+    info = dict(linha.split('=', 1) for linha in saida.split())
+    return float(info['duration']), int(info.get('width', 0)), int(info.get('height', 0))
 
 class AppVideoMaker(ctk.CTk):
     def __init__(self):
@@ -75,8 +103,10 @@ class AppVideoMaker(ctk.CTk):
         self.progress_bar.pack(pady=10)
         ctk.CTkLabel(self, textvariable=self.status_msg, font=("BPreplay", 12, "italic")).pack()
 
-        self.btn_gerar = ctk.CTkButton(self, text="🚀 1. RENDERIZAR (CPU STABLE)", fg_color="#2c3e50", command=self.start_render)
+        self.btn_gerar = ctk.CTkButton(self, text="🚀 1. RENDERIZAR", fg_color="#2c3e50", command=self.start_render)
         self.btn_gerar.pack(pady=10)
+        self.btn_lote = ctk.CTkButton(self, text="📄 RENDERIZAR LOTE (.txt, 1 frase por linha)", fg_color="#2c3e50", command=self.start_render_lote)
+        self.btn_lote.pack(pady=5)
 
         ctk.CTkLabel(self, text="──────────────────────────────", text_color="gray").pack()
         self.combo_longo = ctk.CTkComboBox(self, values=["1h", "4h", "10h"])
@@ -96,80 +126,127 @@ class AppVideoMaker(ctk.CTk):
         self.progress_bar.set(valor)
         self.status_msg.set(f"Processando... ({int(valor*100)}%)")
 
+    def rodar_ffmpeg(self, cmd, duracao, etapa):
+        """
+        Roda o comando ffmpeg com `-progress pipe:1` e move a barra pelo out_time
+        reportado em relação à duração esperada da saída.
+        """
+        cmd = [cmd[0], '-progress', 'pipe:1', '-nostats', *cmd[1:]]
+        with subprocess.Popen(cmd, stdout=subprocess.PIPE, text=True) as proc:
+            for linha in proc.stdout:
+                chave, _, valor = linha.strip().partition('=')
+                # out_time_ms também vem em microssegundos (nome histórico do ffmpeg)
+                if chave in ('out_time_us', 'out_time_ms') and valor.isdigit():
+                    progresso = min(int(valor) / 1e6 / duracao, 1.0)
+                    self.after(0, lambda v=progresso: self.atualizar_barra(v, etapa))
+        if proc.returncode:
+            raise subprocess.CalledProcessError(proc.returncode, cmd)
+
     def start_render(self):
         if not self.bg_path.get() or not self.audio_path.get():
             messagebox.showwarning("Aviso", "Selecione os ativos!")
             return
         threading.Thread(target=self.executar_render, daemon=True).start()
 
+    def start_render_lote(self):
+        if not self.bg_path.get() or not self.audio_path.get():
+            messagebox.showwarning("Aviso", "Selecione os ativos!")
+            return
+        arquivo = filedialog.askopenfilename(filetypes=[("Frases", "*.txt")])
+        if not arquivo:
+            return
+        # Uma frase por linha; linhas em branco são ignoradas
+        with open(arquivo, encoding="utf-8") as f:
+            frases = [linha.strip() for linha in f if linha.strip()]
+        if not frases:
+            messagebox.showwarning("Aviso", "O arquivo não tem frases!")
+            return
+        threading.Thread(target=self.executar_render_batch, args=(frases,), daemon=True).start()
+
     def executar_render(self):
+        self.executar_render_batch([self.entry_frase.get()])
+
+    def executar_render_batch(self, frases):
+        """
+        Renderiza um vídeo por frase. Tudo que não depende do texto (probe do fundo e do
+        áudio, encoder, filter graph, argumentos do ffmpeg) é montado uma vez para o lote;
+        por frase só mudam o PNG do texto e o arquivo de saída.
+        """
         try:
             is_short = "9:16" in self.formato_var.get()
             
-            audio = AudioFileClip(self.audio_path.get()).with_volume_scaled(0.4)
-            if is_short and audio.duration > 59:
+            duracao, _, _ = probe_midia(self.audio_path.get())
+            if is_short and duracao > 59:
                 duracao = 59
-                audio = audio.subclipped(0, duracao)
-            else:
-                duracao = audio.duration
             
             tempo_intro = 5
 
-            bg_clip = VideoFileClip(self.bg_path.get()).without_audio()
-            if is_short:
-                bg_clip = bg_clip.resized(height=1920) 
-            else:
-                bg_clip = bg_clip.resized(height=720)
-
-            n_loops = int(duracao / bg_clip.duration) + 1
-            video_base = concatenate_videoclips([bg_clip] * n_loops).with_duration(duracao)
-            
-            # Filtro escuro (mantido em 70%)
-            filtro = ColorClip(size=video_base.size, color=(0,0,0)).with_duration(duracao).with_opacity(0.7)
-            
-            video_intro = video_base.subclipped(0, tempo_intro).image_transform(aplicar_blur_opencv)
-            video_resto = video_base.subclipped(tempo_intro, duracao)
-            video_final_bg = concatenate_videoclips([video_intro, video_resto])
+            # Mesma conta do scale=-2:altura do ffmpeg: av_rescale(altura, w, h * 2) * 2,
+            # arredondando para o inteiro mais próximo (largura par, proporção mantida)
+            _, bg_w, bg_h = probe_midia(self.bg_path.get())
+            altura = 1920 if is_short else 720
+            largura = (altura * bg_w + bg_h) // (2 * bg_h) * 2
 
             logo_width = 350 if is_short else 280
-            logo = (ImageClip(str(self.logo_path)).resized(width=logo_width)
-                    .with_duration(tempo_intro).with_position('center').with_effects([vfx.FadeOut(duration=1)]))
 
-            frase = self.entry_frase.get()
-            
             # ✅ SOLUÇÃO DEFINITIVA PARA CORTES: Auto-Fit
             # Definimos uma "caixa segura" (90% largura, 80% altura)
-            box_w = int(video_base.w * 0.90)
-            box_h = int(video_base.h * 0.80)
-
-            if is_short:
-                # Para Shorts: NÃO definimos font_size.
-                # Passamos a largura E altura da caixa. O MoviePy calcula a melhor fonte.
-                txt = TextClip(text=frase, color='white', font=self.font_path,
-                               method='caption', size=(box_w, box_h), 
-                               text_align='center')
-            else:
-                # Para Longo: Mantemos o padrão que funcionava, só ajustando a largura
-                txt = TextClip(text=frase, font_size=32, color='white', font=self.font_path,
-                               method='caption', size=(box_w, None), 
-                               text_align='center')
-
-            txt = txt.with_start(tempo_intro).with_duration(duracao - tempo_intro).with_position('center')
-
-            final = CompositeVideoClip([video_final_bg, filtro, logo, txt]).with_audio(audio)
-            
+            box_w = int(largura * 0.90)
+            box_h = int(altura * 0.80)
+
             tipo_pasta = "shorts" if is_short else "long_form"
             out_path = self.prod_path / tipo_pasta
             out_path.mkdir(parents=True, exist_ok=True)
-            self.last_video = out_path / f"render_{int(time.time())}.mp4"
-            
-            # Encoder seguro (CPU)
-            final.write_videofile(
-                str(self.last_video), fps=8, codec="libx264", 
-                threads=4, preset="ultrafast", logger=MugiwaraLogger(self)
+
+            # Todo o resto roda dentro do ffmpeg (decode → filtros → encode), sem passar
+            # cada frame pelo Python: loop do fundo, blur só na intro (timeline do filtro,
+            # sem dividir e reconcatenar o stream), filtro escuro (70%), logo com fade-out
+            # e o texto, que o MoviePy só renderiza uma vez como PNG
+            filtros = (
+                f"[0:v]scale=-2:{altura},gblur=sigma=10:enable='lt(t,{tempo_intro})',"
+                f"drawbox=color=black@0.7:t=fill[fundo];"
+                f"[2:v]scale={logo_width}:-1,format=rgba,"
+                f"fade=t=out:st={tempo_intro - 1}:d=1:alpha=1[logo];"
+                f"[fundo][logo]overlay=(W-w)/2:(H-h)/2:eof_action=pass[v1];"
+                f"[v1][3:v]overlay=(W-w)/2:(H-h)/2:enable='gte(t,{tempo_intro})'[vout]"
             )
+            # Encoder de hardware quando disponível (libx264 na CPU como fallback)
+            codec = escolher_encoder()
+            preset, params = ENCODERS[codec]
+            entradas = ['-stream_loop', '-1', '-i', self.bg_path.get(),
+                        '-i', self.audio_path.get(),
+                        '-loop', '1', '-t', str(tempo_intro), '-i', str(self.logo_path)]
+            saida = ['-filter_complex', filtros, '-map', '[vout]', '-map', '1:a',
+                     '-af', 'volume=0.4', '-t', str(duracao),
+                     '-c:v', codec, *(['-preset', preset] if preset else []), *params,
+                     '-pix_fmt', 'yuv420p', '-c:a', 'aac']
+
+            lote = int(time.time())
+            with tempfile.TemporaryDirectory() as tmp:
+                for i, frase in enumerate(frases):
+                    if is_short:
+                        # Para Shorts: NÃO definimos font_size.
+                        # Passamos a largura E altura da caixa. O MoviePy calcula a melhor fonte.
+                        txt = TextClip(text=frase, color='white', font=self.font_path,
+                                       method='caption', size=(box_w, box_h), 
+                                       text_align='center')
+                    else:
+                        # Para Longo: Mantemos o padrão que funcionava, só ajustando a largura
+                        txt = TextClip(text=frase, font_size=32, color='white', font=self.font_path,
+                                       method='caption', size=(box_w, None), 
+                                       text_align='center')
+
+                    texto_png = str(Path(tmp) / f"texto_{i}.png")
+                    txt.save_frame(texto_png)
+                    txt.close()
+
+                    sufixo = f"_{i + 1}" if len(frases) > 1 else ""
+                    self.last_video = out_path / f"render_{lote}{sufixo}.mp4"
+                    cmd = ['ffmpeg', '-y', '-hide_banner', '-loglevel', 'error',
+                           *entradas, '-i', texto_png, *saida, str(self.last_video)]
+                    self.rodar_ffmpeg(cmd, duracao, "video")
             
-            messagebox.showinfo("Sucesso", f"Vídeo salvo em {tipo_pasta} com texto ajustado!")
+            messagebox.showinfo("Sucesso", f"{len(frases)} vídeo(s) salvo(s) em {tipo_pasta} com texto ajustado!")
         except Exception as e:
             messagebox.showerror("Erro", f"Falha na produção: {e}")
 
@@ -184,19 +261,15 @@ class AppVideoMaker(ctk.CTk):
             self.status_msg.set("Concatenando via FFmpeg...")
             target = self.combo_longo.get()
             horas = int(target.replace("h", ""))
-            clip_temp = VideoFileClip(str(self.last_video))
-            n_reps = int((horas * 3600) / clip_temp.duration)
-            clip_temp.close()
+            duracao_bloco, _, _ = probe_midia(self.last_video)
+            n_reps = max(int((horas * 3600) / duracao_bloco), 1)
 
-            list_path = self.root_path / "temp_list.txt"
             output_final = self.prod_path / "long_form" / f"video_{target}_{int(time.time())}.mp4"
 
-            with open(list_path, "w") as f:
-                for _ in range(n_reps): f.write(f"file '{self.last_video.name}'\n")
-
-            cmd = ['ffmpeg', '-y', '-f', 'concat', '-safe', '0', '-i', str(list_path), '-c', 'copy', str(output_final)]
-            subprocess.run(cmd, cwd=str(self.last_video.parent), check=True)
-            list_path.unlink()
+            # O próprio demuxer repete o bloco (n_reps - 1 voltas extras): sem lista temporária
+            cmd = ['ffmpeg', '-y', '-stream_loop', str(n_reps - 1), '-i', str(self.last_video),
+                   '-c', 'copy', str(output_final)]
+            self.rodar_ffmpeg(cmd, n_reps * duracao_bloco, "concat")
             messagebox.showinfo("Sucesso", f"Vídeo de {target} concluído!")
             self.status_msg.set("Pronto!")
         except Exception as e: